@@ -0,0 +1,226 @@
+"""
+localindex.py — Shared on-disk index of bookmarks and quickmarks.
+
+bookmarks.py, quickmarks.py and search.py all read their sources through
+this one SQLite file instead of parsing them on every launch. A source is
+re-read only when its mtime or size changes: the owning script's loader turns
+it into rows, which replace that source's rows in a single transaction.
+
+Rows keep their document order (pos), the pos of their parent folder and that
+folder's path, so a bookmark tree can be read back one folder at a time or as
+one flat list of links. Every row is also filed in a term
+table under each word start of its title, its URL without the scheme and its
+quickmark keyword, which turns a prefix lookup into one index range scan.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+
+# ── Config ────────────────────────────────────────────────────────────────────
+INDEX_DB = os.path.expanduser("~/.cache/userscripts/index.db")
+_SCHEMA_VERSION = 3
+
+# A loader returns one tuple per row, in document order:
+#   (parent pos or -1, title, url or None for a folder, keyword or None)
+
+
+def _terms(title: str, url: "str | None", keyword: "str | None") -> set[str]:
+    low = " ".join(title.lower().split())
+    terms = {low} | {low[i + 1 :] for i, ch in enumerate(low) if ch == " "}
+    if url:
+        bare = url.lower().split("://", 1)[-1]
+        terms.add(bare[4:] if bare.startswith("www.") else bare)
+    if keyword:
+        terms.add(keyword.lower())
+    terms.discard("")
+    return terms
+
+
+def _folder_paths(rows: list[tuple]) -> list[str]:
+    """The folder path ("Dev / Rust") each row sits in, "" for top-level rows."""
+    paths: list[str] = []
+    for parent, _, _, _ in rows:
+        if parent < 0:
+            paths.append("")
+            continue
+        above, title = paths[parent], " ".join(rows[parent][1].split())
+        paths.append(f"{above} / {title}" if above else title)
+    return paths
+
+
+class LocalIndex:
+    """Bookmark and quickmark rows, kept in sync with their source files."""
+
+    def __init__(self, path: "str | None" = None) -> None:
+        self.path = path = path or INDEX_DB
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(
+            path, timeout=2.0, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version == _SCHEMA_VERSION:
+            return  # set up by an earlier connection; WAL mode is persistent
+        self._db.executescript(
+            """
+            DROP TABLE IF EXISTS sources;
+            DROP TABLE IF EXISTS items;
+            DROP TABLE IF EXISTS terms;
+            """
+        )
+        self._db.executescript(
+            f"""
+            PRAGMA journal_mode=WAL;
+            PRAGMA user_version={_SCHEMA_VERSION};
+            CREATE TABLE IF NOT EXISTS sources (
+                path     TEXT PRIMARY KEY,
+                kind     TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size     INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS items (
+                source  TEXT NOT NULL,
+                pos     INTEGER NOT NULL,
+                parent  INTEGER NOT NULL,
+                kind    TEXT NOT NULL,
+                title   TEXT NOT NULL,
+                url     TEXT,
+                keyword TEXT,
+                folder  TEXT NOT NULL,
+                PRIMARY KEY (source, pos)
+            );
+            CREATE TABLE IF NOT EXISTS terms (
+                term   TEXT NOT NULL,
+                source TEXT NOT NULL,
+                pos    INTEGER NOT NULL,
+                PRIMARY KEY (term, source, pos)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS items_parent ON items(source, parent, pos);
+            """
+        )
+
+    def refresh(self, kind: str, path: str, loader) -> bool:
+        """
+        Re-read path with loader(path) -> row tuples if it changed since it was
+        last indexed; a vanished file drops its rows. True if anything changed.
+        """
+        stale = self.stale([path])
+        if not stale:
+            return False
+        sig = stale[path]
+        self.store(kind, path, sig, loader(path) if sig is not None else [])
+        return True
+
+    def stale(self, paths: list[str]) -> "dict[str, tuple[int, int] | None]":
+        """
+        path -> its current (mtime_ns, size), or None if it is gone, for each
+        of paths whose indexed rows are out of date.
+        """
+        stale = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+                sig = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                sig = None
+            if self.version(path) != sig:
+                stale[path] = sig
+        return stale
+
+    def version(self, path: str) -> "tuple[int, int] | None":
+        """The (mtime_ns, size) path's rows were read at, None if not indexed."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT mtime_ns, size FROM sources WHERE path = ?", (path,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def store(self, kind: str, path: str, sig, rows: list[tuple]) -> None:
+        """Replace path's rows, recording sig as the version they were read from."""
+        with self._lock:
+            self._replace(kind, path, sig, rows)
+
+    def _replace(self, kind: str, path: str, sig, rows: list[tuple]) -> None:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute("DELETE FROM items WHERE source = ?", (path,))
+            self._db.execute("DELETE FROM terms WHERE source = ?", (path,))
+            self._db.execute("DELETE FROM sources WHERE path = ?", (path,))
+            if sig is not None:
+                folders = _folder_paths(rows)
+                self._db.executemany(
+                    "INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (path, pos, parent, kind, title, url, keyword, folders[pos])
+                        for pos, (parent, title, url, keyword) in enumerate(rows)
+                    ),
+                )
+                # Sorted, the term B-tree is filled by appends instead of
+                # random inserts, several times faster for large files
+                terms = sorted(
+                    (term, path, pos)
+                    for pos, (_, title, url, keyword) in enumerate(rows)
+                    for term in _terms(title, url, keyword)
+                )
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO terms VALUES (?, ?, ?)", terms
+                )
+                self._db.execute(
+                    "INSERT INTO sources VALUES (?, ?, ?, ?)", (path, kind, *sig)
+                )
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def items(self, path: str) -> list[tuple]:
+        """(pos, parent, title, url, keyword) of every row of path, in order."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT pos, parent, title, url, keyword FROM items "
+                "WHERE source = ? ORDER BY pos",
+                (path,),
+            ).fetchall()
+
+    def links(self, path: str) -> list[tuple]:
+        """(title, url, folder path) of every link of path, in document order."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT title, url, folder FROM items "
+                "WHERE source = ? AND url IS NOT NULL ORDER BY pos",
+                (path,),
+            ).fetchall()
+
+    def children(self, path: str, parent: int) -> list[tuple]:
+        """(pos, title, url) of the rows directly under folder parent (-1: top)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT pos, title, url FROM items "
+                "WHERE source = ? AND parent = ? ORDER BY pos",
+                (path, parent),
+            ).fetchall()
+
+    def search(self, prefix: str, limit: int = 5) -> list[tuple]:
+        """
+        (kind, title, url, keyword) of links with a term starting with prefix,
+        quickmarks first, then bookmarks in document order.
+        """
+        q = " ".join(prefix.lower().split())
+        if not q:
+            return []
+        with self._lock:
+            return self._db.execute(
+                "SELECT i.kind, i.title, i.url, i.keyword FROM terms t "
+                "JOIN items i ON i.source = t.source AND i.pos = t.pos "
+                "WHERE t.term >= ? AND t.term < ? AND i.url IS NOT NULL "
+                "GROUP BY i.source, i.pos "
+                "ORDER BY i.kind != 'quickmark', i.source, i.pos LIMIT ?",
+                (q, q + "\U0010ffff", limit),
+            ).fetchall()
+
+    def close(self) -> None:
+        self._db.close()
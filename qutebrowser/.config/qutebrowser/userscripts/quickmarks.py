@@ -27,6 +27,29 @@ def load_quickmarks(filepath):
     return marks
 
 
+def index_rows(filepath):
+    """Quickmarks as localindex rows: the keyword doubles as the title."""
+    return [(-1, k, url, k) for k, url in load_quickmarks(filepath).items()]
+
+
+def cached_quickmarks(filepath):
+    """load_quickmarks(), read through the shared local index."""
+    import sqlite3
+
+    from localindex import LocalIndex
+
+    if not os.path.exists(filepath):
+        return load_quickmarks(filepath)
+    try:
+        index = LocalIndex()
+        index.refresh("quickmark", filepath, index_rows)
+        rows = index.items(filepath)
+        index.close()
+    except sqlite3.Error:
+        return load_quickmarks(filepath)
+    return {keyword: url for _, _, _, url, keyword in rows}
+
+
 def menu_select(items, prompt=" Quickmarks:"):
     if IS_WAYLAND:
         cmd = ["rofi", "-dmenu", "-i", "-p", prompt]
@@ -50,7 +73,7 @@ def main():
     parser.add_argument("--file", default=QUICKMARKS_FILE)
     args = parser.parse_args()
 
-    quickmarks = load_quickmarks(args.file)
+    quickmarks = cached_quickmarks(args.file)
 
     if not quickmarks:
         print(f"No bookmarks found in {args.file}")
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+search_bench.py — Performance checks for search.py.
+
+Commands:
+  imports   run the per-keystroke script-mode render (ROFI_RETV=0) under
+            `python -X importtime` and fail when the modules it imports on top
+            of a bare interpreter take longer than --budget-ms
+  latency   generate history and completion caches of --sizes entries, drive
+            script_mode() in-process through the search, history and confirm
+            menus and print p50/p99 latency and stdout bytes as JSON
+  compare   print the p50/p99 change per scenario between two latency JSONs
+
+Every run works in a throwaway directory, so the real history, bookmarks,
+completion and phrase caches, shared index and a running --daemon are never
+touched.
+
+Comparing two revisions:
+  search_bench.py latency -o before.json
+  git checkout <other> && search_bench.py latency -o after.json
+  search_bench.py compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+# latency drives websearch's internals directly
+# pylint: disable=protected-access
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+SCRIPT = os.path.join(HERE, "search.py")
+
+IMPORT_BUDGET_MS = 30.0
+IMPORT_RUNS = 5  # best run counts; the first one also writes the .pyc
+# (label, typed query) rendered with ROFI_RETV=0
+IMPORT_CASES = [("history", ""), ("completions", "rust async")]
+
+
+# ── Sandbox ───────────────────────────────────────────────────────────────────
+def _sandbox(root: str) -> dict[str, str]:
+    """Script-mode environment rooted at root, with some history to render."""
+    hfile = os.path.join(root, "history.txt")
+    with open(hfile, "w", encoding="utf-8") as f:
+        for i in range(200):
+            f.write(f"2026-01-01 10:{i % 60:02d}\tquery number {i}\n")
+    return {
+        "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+        "HOME": root,
+        "XDG_RUNTIME_DIR": root,
+        "WAYLAND_DISPLAY": "wayland-bench",
+        "WEBSEARCH_ACTIVE": "1",
+        "WEBSEARCH_HISTORY": hfile,
+        "ROFI_RETV": "0",
+    }
+
+
+def _seed_completions(env: dict[str, str], queries: list[str]) -> None:
+    """Cache fresh completions so renders never spawn a network fetch."""
+    code = (
+        "import sys, websearch as w\n"
+        "for q in sys.argv[1:]:\n"
+        "    w._write_cache(w._cache_key(q, w.DEFAULT_ENGINE), [q + ' x', q + ' y'])\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code, *queries], env=env, cwd=HERE, check=True
+    )
+
+
+# ── Import time ───────────────────────────────────────────────────────────────
+def _import_times(argv: list[str], env: dict[str, str]) -> dict[str, int]:
+    """Top-level module -> cumulative import time (µs) for one importtime run."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    times: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2][1:]
+        if not name.startswith(" "):  # nested imports are already in cumulative
+            times[name] = int(parts[1])
+    return times
+
+
+def bench_imports(args: argparse.Namespace) -> int:
+    with tempfile.TemporaryDirectory(prefix="search-bench-") as root:
+        env = _sandbox(root)
+        _seed_completions(env, [q for _, q in IMPORT_CASES if q])
+        baseline = _import_times(["-c", "pass"], env)
+        failed = False
+        for label, query in IMPORT_CASES:
+            best: "dict[str, int] | None" = None
+            for _ in range(args.runs):
+                times = _import_times([SCRIPT, query], env)
+                extra = {m: us for m, us in times.items() if m not in baseline}
+                if best is None or sum(extra.values()) < sum(best.values()):
+                    best = extra
+            assert best is not None
+            total = sum(best.values()) / 1000
+            verdict = "ok" if total <= args.budget_ms else "OVER BUDGET"
+            failed |= total > args.budget_ms
+            print(f"{label:<12} {total:7.1f} ms / {args.budget_ms:.1f} ms  {verdict}")
+            heaviest = sorted(best.items(), key=lambda kv: -kv[1])[: args.top]
+            for name, us in heaviest:
+                print(f"    {us / 1000:7.1f} ms  {name}")
+    return 1 if failed else 0
+
+
+# ── Script-mode latency ───────────────────────────────────────────────────────
+LATENCY_SIZES = [100, 10_000, 100_000]
+LATENCY_ITERATIONS = 30
+LATENCY_WARMUP = 2  # untimed renders first: build the snapshot and index files
+_WORDS = (
+    "linux rust python arch wiki async kernel rofi wayland docs git tips "
+    "install config error release vim sway nix debian package api tutorial"
+).split()
+_TYPED = "rust async"
+
+# (name, mode, ROFI_RETV, argv[1], WEBSEARCH_FILTER); queries are filled in
+# from the websearch sentinels at run time
+LATENCY_SCENARIOS = [
+    ("search-empty", "search", 0, "", "rofi"),
+    ("search-typed", "search", 0, _TYPED, "rofi"),
+    ("search-server", "search", 0, _TYPED, "server"),
+    ("search-bang", "search", 0, f"!gh {_TYPED}", "rofi"),
+    ("history", "history", 0, "", "rofi"),
+    ("confirm", "history", 1, "{CLEAR_ALL}", "rofi"),
+]
+
+
+def _percentile(samples: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def _generate(ws, root: str, entries: int) -> str:
+    """Write a history journal, bookmarks and completion cache of entries rows."""
+    rng = random.Random(entries)
+    hfile = os.path.join(root, f"history-{entries}.txt")
+    start = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    with open(hfile, "w", encoding="utf-8") as f:
+        for i in range(entries):
+            ts = time.strftime("%Y-%m-%d %H:%M", time.localtime(start + i * 60))
+            f.write(f"{ts}\t{' '.join(rng.sample(_WORDS, 3))} {i}\n")
+    with open(ws.BOOKMARKS_FILE, "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE NETSCAPE-Bookmark-file-1>\n<DL><p>\n")
+        for i in range(entries):
+            title = " ".join(rng.sample(_WORDS, 4))
+            f.write(f'<DT><A HREF="https://{rng.choice(_WORDS)}.org/{i}">{title}</A>\n')
+        f.write("</DL><p>\n")
+    cache = ws.CompletionCache(
+        ws.CACHE_DB, max_entries=entries + 10, max_bytes=1 << 40
+    )
+    synthetic = {
+        ws._cache_key(f"{rng.choice(_WORDS)} {i}", ws.DEFAULT_ENGINE): [
+            f"{rng.choice(_WORDS)} {i} {n}" for n in range(ws.MAX_COMPLETIONS)
+        ]
+        for i in range(entries)
+    }
+    # The typed queries are fresh, so renders never schedule a network fetch
+    for q in (_TYPED, f"{_TYPED} x"):
+        synthetic[ws._cache_key(q, ws.DEFAULT_ENGINE)] = [f"{q} {w}" for w in _WORDS]
+    cache.put_many(synthetic)
+    cache._db.close()
+    return hfile
+
+
+def _reset(ws) -> None:
+    """Drop in-memory state so each render starts like a fresh process."""
+    for memo in (
+        ws._HISTORY_MEMO,
+        ws._RANK_MEMO,
+        ws._SNAPSHOT_MEMO,
+        ws._TRIGRAM_MEMO,
+        ws._PHRASE_MEMO,
+    ):
+        memo.clear()
+    ws._REGISTRY = None
+    if ws._SHARED_INDEX is not None:
+        ws._SHARED_INDEX.close()
+        ws._SHARED_INDEX = None
+    if ws._CACHE is not None:
+        ws._CACHE._db.close()
+        ws._CACHE = None
+
+
+def bench_latency(args: argparse.Namespace) -> int:
+    import localindex
+    import websearch as ws
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="search-bench-") as root:
+        # Point every path the script touches into the sandbox
+        ws.SESSION_DIR = os.path.join(root, "sessions")
+        ws.CACHE_DB = os.path.join(root, "completions.db")
+        ws.INFLIGHT_DIR = os.path.join(root, "inflight")
+        ws.INFLIGHT_STATS = os.path.join(ws.INFLIGHT_DIR, "stats.json")
+        ws.INFLIGHT_COUNTS = os.path.join(ws.INFLIGHT_DIR, "stats.log")
+        ws.INFLIGHT_REFRESH = os.path.join(ws.INFLIGHT_DIR, "refresh.json")
+        ws.BANGS_FILE = os.path.join(root, "bangs.tsv")
+        ws.BANGS_CACHE = os.path.join(root, "bangs.pickle")
+        ws.DAEMON_SOCKET = os.path.join(root, "no-daemon.sock")
+        ws.LOCAL_INDEX_CACHE = os.path.join(root, "phrases.pickle")
+        ws.LOCAL_HISTORY_CACHE = os.path.join(root, "history-phrases.pickle")
+        ws.BOOKMARKS_FILE = os.path.join(root, "bookmarks.html")
+        ws.QUICKMARKS_FILE = os.path.join(root, "quickmarks.txt")
+        localindex.INDEX_DB = os.path.join(root, "index.db")
+        ws.LOG_FILE = ""
+        ws._configure_log("error", "text")
+        for entries in args.sizes:
+            # Lift the cap so every generated entry is loaded and rendered
+            ws.MAX_HISTORY = entries
+            ws.HISTORY_COMPACT_LINES = 2 * entries
+            _reset(ws)
+            if os.path.exists(ws.CACHE_DB):
+                os.unlink(ws.CACHE_DB)
+            hfile = _generate(ws, root, entries)
+            # Index the bookmarks up front, as the background refresh would
+            ws.refresh_local_index()
+            for name, mode, retv, query, filter_mode in LATENCY_SCENARIOS:
+                query = query.format(CLEAR_ALL=ws.CLEAR_ALL)
+                env = {
+                    "ROFI_DATA": mode,
+                    "ROFI_RETV": str(retv),
+                    "WEBSEARCH_ACTIVE": "1",
+                    "WEBSEARCH_ENGINE": ws.DEFAULT_ENGINE,
+                    "WEBSEARCH_BROWSER": "true",
+                    "WEBSEARCH_HISTORY": hfile,
+                    "WEBSEARCH_RANK": args.rank,
+                    "WEBSEARCH_FILTER": filter_mode,
+                }
+                argv = ["search.py", query] if query else ["search.py"]
+                samples, size = [], 0
+                for i in range(LATENCY_WARMUP + args.iterations):
+                    if not args.warm:
+                        _reset(ws)
+                    t0 = time.perf_counter()
+                    out = ws._daemon_render(argv, env, None)
+                    elapsed = time.perf_counter() - t0
+                    if i >= LATENCY_WARMUP:
+                        samples.append(elapsed * 1000)
+                        size = len(out)
+                samples.sort()
+                result = {
+                    "scenario": name,
+                    "entries": entries,
+                    "mode": mode,
+                    "retv": retv,
+                    "filter": filter_mode,
+                    "iterations": args.iterations,
+                    "p50_ms": round(_percentile(samples, 50), 3),
+                    "p99_ms": round(_percentile(samples, 99), 3),
+                    "mean_ms": round(sum(samples) / len(samples), 3),
+                    "stdout_bytes": size,
+                }
+                results.append(result)
+                print(
+                    f"{name:<14} {entries:>7}  p50 {result['p50_ms']:8.2f} ms  "
+                    f"p99 {result['p99_ms']:8.2f} ms  {size:>9} B",
+                    file=sys.stderr,
+                )
+    report = {
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "rank": args.rank,
+        "warm": args.warm,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+def _revision() -> "str | None":
+    proc = subprocess.run(
+        ["git", "-C", HERE, "describe", "--always", "--dirty"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return proc.stdout.strip() or None
+
+
+def bench_compare(args: argparse.Namespace) -> int:
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    old = {(r["scenario"], r["entries"]): r for r in before["results"]}
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+    for r in after["results"]:
+        o = old.get((r["scenario"], r["entries"]))
+        if o is None:
+            continue
+        print(
+            f"{r['scenario']:<14} {r['entries']:>7}  "
+            f"p50 {o['p50_ms']:8.2f} -> {r['p50_ms']:8.2f} ms "
+            f"({r['p50_ms'] / max(o['p50_ms'], 1e-9):5.2f}x)  "
+            f"p99 {o['p99_ms']:8.2f} -> {r['p99_ms']:8.2f} ms"
+        )
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    imports = sub.add_parser("imports", help="check script-mode import time")
+    imports.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    imports.add_argument("--runs", type=int, default=IMPORT_RUNS)
+    imports.add_argument("--top", type=int, default=5, help="modules to list")
+    imports.set_defaults(run=bench_imports)
+    latency = sub.add_parser("latency", help="time script_mode renders")
+    latency.add_argument(
+        "--sizes",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=LATENCY_SIZES,
+        help="comma-separated history/cache sizes",
+    )
+    latency.add_argument("--iterations", type=int, default=LATENCY_ITERATIONS)
+    latency.add_argument("--rank", default="recency", choices=["recency", "frecency"])
+    latency.add_argument(
+        "--warm",
+        action="store_true",
+        help="keep in-memory state between renders, as the --daemon does",
+    )
+    latency.add_argument("-o", "--output", help="write the JSON report here")
+    latency.set_defaults(run=bench_latency)
+    compare = sub.add_parser("compare", help="compare two latency reports")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    compare.set_defaults(run=bench_compare)
+    args = parser.parse_args()
+    sys.exit(args.run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3340 @@
+"""
+search.py — Web search / URL launcher via rofi with "press-to-fetch" completions.
+
+Bang shortcuts (!):
+  Prefix your query with a bang to search a specific site directly, e.g.:
+    !yt linux tips        → YouTube search
+    !aw pacman            → Arch Wiki search
+    !gh rust async        → GitHub search
+  Type just "!" to see all available bangs listed in the menu.
+
+How to use it:
+  1. Type your query: Rofi will instantly filter your local history.
+  2. Press [Enter]: Immediately searches the exact text you typed.
+  3. Press [Shift+Enter]*: Fetches live web suggestions from the internet.
+
+Offline completions:
+  Phrases from your history and bookmark titles (bookmarks.html) are
+  suggested as you type, alongside the web ones, and keep working without a
+  network connection. Bookmarks and quickmarks (quickmarks.txt) whose title,
+  URL or keyword starts with the query are listed below them; both files are
+  read through the index shared with bookmarks.py and quickmarks.py.
+
+Modes:
+  search   — main search bar with history and fetchable live completions
+  history  — browse or delete specific history entries
+  confirm  — yes/no confirmation prompt for clearing all history
+
+Ranking:
+  --rank recency   history in last-used order (default)
+  --rank frecency  history by visit count with decayed recency
+
+Filtering:
+  --filter rofi    every history row is sent and rofi filters (default)
+  --filter server  search.py fuzzy-matches history itself and sends only the
+                   best rows, keeping each render's output a constant size
+
+Daemon:
+  search.py --daemon keeps a completion server running on a Unix socket.
+  Script-mode renders are forwarded to it so the HTTP connection, the
+  completion cache and the loaded history stay in memory between keystrokes.
+  When the daemon is not running every render falls back to a fresh process.
+
+Logging:
+  --log-level LEVEL   debug, info, warning (default) or error, written to
+                      LOG_FILE in one buffered append per run, size-rotated
+  --log-format json   JSON lines instead of text; at info and below each run
+                      also logs its phase timings (history, cache, render)
+
+Metrics:
+  --metrics           record every run's phase timings (start-up, history
+                      load, cache read, local completions, render, fetch,
+                      cache write) into
+                      ~/.cache/rofi-websearch/metrics.json
+  --stats             print count, mean and p50/p95/p99/max per phase
+"""
+
+from __future__ import annotations
+
+import array
+import bisect
+import math
+import mmap
+
+# ── Display server detection ─────────────────────────────────────────────────
+import os
+import os as _os
+import struct
+import sys
+import time
+
+# Everything else is imported where it is used: a keystroke render only pays
+# for the modules its own path needs (see search_bench.py imports).
+
+# Modules named only in annotations. Type checkers treat TYPE_CHECKING as true;
+# importing it from typing would cost each run ~15 ms.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    import re
+    import threading
+
+IS_WAYLAND = bool(_os.environ.get("WAYLAND_DISPLAY"))
+
+# ── Config ────────────────────────────────────────────────────────────────────
+DEFAULT_HISTORY_FILE = os.path.expanduser("~/.local/share/rofi-websearch/history.txt")
+# Per-session mode files, written only when a session changes mode
+SESSION_DIR = (
+    os.path.join(os.environ["XDG_RUNTIME_DIR"], "rofi-websearch")
+    if os.environ.get("XDG_RUNTIME_DIR")
+    else f"/tmp/rofi-websearch-{os.getuid()}"
+)
+MAX_HISTORY = 200
+COMPLETION_TIMEOUT = 1.5
+MAX_COMPLETIONS = 6
+# Suggestion endpoints ({} = URL-encoded query), all answering ["query", [...]]
+COMPLETION_PROVIDERS = {
+    "duckduckgo": "https://duckduckgo.com/ac/?q={}&type=list",
+    "google": "https://suggestqueries.google.com/complete/search?client=firefox&q={}",
+}
+COMPLETION_SOURCES = ["duckduckgo", "google"]  # queried in parallel, merged in order
+# Cached suggestion lists are fresh for COMPLETION_FRESH seconds (served, no
+# request), then stale until CACHE_TTL (served while one refetch runs), then
+# expired (dropped and fetched again as a miss).
+COMPLETION_FRESH = 3600
+CACHE_TTL = 7 * 24 * 3600
+COMPLETION_RETRY = 30  # seconds before a query whose fetch failed is retried
+CACHE_MAX_ENTRIES = 5000
+CACHE_MAX_BYTES = 4 * 1024 * 1024
+# Offline suggestions mined from history and bookmarks plus matching bookmark and
+# quickmark links, shown with the network ones (LOCAL_COMPLETIONS = False: off)
+LOCAL_COMPLETIONS = True
+BOOKMARKS_FILE = os.path.expanduser("~/.local/share/bookmarks/bookmarks.html")
+QUICKMARKS_FILE = os.path.expanduser("~/.local/share/bookmarks/quickmarks.txt")
+LOCAL_HITS = 4  # bookmark/quickmark links listed under the completions
+LOG_FILE = "/tmp/search-debug.log"  # set to "" to disable
+LOG_LEVEL = "warning"  # "debug", "info", "warning" or "error"
+LOG_FORMAT = "text"  # "json": one JSON object per line, plus per-run timings
+LOG_MAX_BYTES = 1024 * 1024  # rotate LOG_FILE once it grows past this
+LOG_BACKUPS = 3  # rotated files kept as LOG_FILE.1 ... LOG_FILE.<n>
+METRICS = False  # record per-phase timings for --stats (or WEBSEARCH_METRICS=1)
+METRICS_FILE = os.path.expanduser("~/.cache/rofi-websearch/metrics.json")
+METRICS_JOURNAL = os.path.expanduser("~/.cache/rofi-websearch/metrics.log")
+METRICS_FOLD_BYTES = 64 * 1024  # fold the journal into METRICS_FILE past this
+DAEMON_SOCKET = (
+    os.path.join(os.environ["XDG_RUNTIME_DIR"], "rofi-websearch.sock")
+    if os.environ.get("XDG_RUNTIME_DIR")
+    else f"/tmp/rofi-websearch-{os.getuid()}.sock"
+)
+DAEMON_TIMEOUT = 2.0
+
+SEARCH_ENGINES = {
+    "searxng": "https://searxng.linuxlab.work/search?q={}",
+    "brave": "https://search.brave.com/search?q={}",
+    "duckduckgo": "https://duckduckgo.com/?q={}",
+}
+DEFAULT_ENGINE = "searxng"
+DEFAULT_RANK = "recency"  # history order: "recency" or "frecency"
+DEFAULT_FILTER = "rofi"  # "server": search.py matches and emits only the top rows
+
+# ── Bang shortcuts ─────────────────────────────────────────────────────────────
+# Format: "!bang": ("Display Label", "https://example.com/search?q={}")
+# The {} placeholder is replaced with the URL-encoded query.
+BANGS: dict[str, tuple[str, str]] = {
+    # ── Dev / code ────────────────────────────────────────────────────────────
+    "!gh": ("GitHub", "https://github.com/search?q={}"),
+    "!so": ("Stack Overflow", "https://stackoverflow.com/search?q={}"),
+    "!pypi": ("PyPI", "https://pypi.org/search/?q={}"),
+    "!cra": ("crates.io", "https://crates.io/search?q={}"),
+    "!npm": ("npm", "https://www.npmjs.com/search?q={}"),
+    # ── Linux / distro ────────────────────────────────────────────────────────
+    "!dp": ("Debian Packages", "https://packages.debian.org/search?keywords={}"),
+    "!aw": ("Arch Wiki", "https://wiki.archlinux.org/?search={}"),
+    "!ah": ("Arch Packages", "https://archlinux.org/packages/?sort=&q={}"),
+    "!ar": ("AUR", "https://aur.archlinux.org/packages?O=0&K={}"),
+    "!fh": ("Flathub", "https://flathub.org/apps/search?q={}"),
+    "!gw": ("Gentoo Wiki", "https://wiki.gentoo.org/index.php?search={}"),
+    "!nw": ("NixOS Wiki", "https://wiki.nixos.org/w/index.php?search={}"),
+    # ── Reference ─────────────────────────────────────────────────────────────
+    "!wiki": ("Wikipedia", "https://en.wikipedia.org/wiki/{}"),
+    "!wikt": ("Wiktionary", "https://en.wiktionary.org/wiki/{}"),
+    "!wb": ("Wolfram Alpha", "https://www.wolframalpha.com/input?i={}"),
+    # ── Media / entertainment ─────────────────────────────────────────────────
+    "!yt": ("YouTube", "https://www.youtube.com/search?q={}"),
+    "!tv": ("Twitch", "https://www.twitch.tv/search?term={}"),
+    "!pd": ("ProtonDB", "https://www.protondb.com/search?q={}"),
+    "!rd": ("Reddit", "https://www.reddit.com/search/?q={}"),
+}
+
+
+# ── Logging ───────────────────────────────────────────────────────────────────
+# _log() only formats and buffers a record when its level is enabled, so a
+# disabled level costs one comparison. The buffer is appended to LOG_FILE in a
+# single write when the process exits (the daemon flushes after every request),
+# rotating the file first when the write would take it past LOG_MAX_BYTES.
+#
+# _phase() blocks time the stages of a run (history load, cache read, render,
+# ...); at the "info" level each run ends with a "timings" record holding them.
+# WEBSEARCH_LOG_LEVEL / WEBSEARCH_LOG_FORMAT (or --log-level and --log-format)
+# override the defaults above.
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LOG_LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LOG_FORMATS = ("text", "json")
+_LOG_NAMES = {v: k for k, v in LOG_LEVELS.items()}
+_LOG_FLUSH_RECORDS = 256  # flush early if a long-lived process logs this much
+
+_LOG_LEVEL = ERROR + 1  # set by _configure_log(); above ERROR = disabled
+_LOG_JSON = False
+_LOG_BUFFER: list[str] = []
+_LOG_ATEXIT = False
+_PHASES: dict[str, float] = {}
+_METRICS = False
+_TIMING = False  # phases are timed: logged at info level and/or METRICS is on
+
+
+def _configure_log(level: str, fmt: str, metrics: bool = METRICS) -> None:
+    global _LOG_LEVEL, _LOG_JSON, _METRICS, _TIMING  # pylint: disable=global-statement
+    _LOG_LEVEL = LOG_LEVELS.get(level.lower(), WARNING) if LOG_FILE else ERROR + 1
+    _LOG_JSON = fmt == "json"
+    _METRICS = metrics
+    _TIMING = metrics or _LOG_LEVEL <= INFO
+
+
+def _log(msg: str, *args, level: int = DEBUG, **fields) -> None:
+    """
+    Buffer msg % args at level; nothing is formatted when level is disabled.
+    Extra keyword fields become JSON keys, or "key=value" pairs in text.
+    """
+    if level < _LOG_LEVEL:
+        return
+    if args:
+        msg = msg % args
+    now = time.time()
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now))
+    stamp = f"{stamp}.{int(now % 1 * 1e6):06d}"
+    name = _LOG_NAMES[level]
+    if _LOG_JSON:
+        import json
+
+        record = {"ts": stamp, "level": name, "pid": os.getpid(), "msg": msg}
+        record.update(fields)
+        _LOG_BUFFER.append(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        extra = "".join(f" {k}={v}" for k, v in fields.items())
+        line = f"{stamp} {name.upper():<7} [{os.getpid()}] {msg}{extra}\n"
+        _LOG_BUFFER.append(line)
+    _flush_at_exit()
+    if len(_LOG_BUFFER) >= _LOG_FLUSH_RECORDS:
+        _flush_log()
+
+
+def _flush_at_exit() -> None:
+    global _LOG_ATEXIT  # pylint: disable=global-statement
+    if not _LOG_ATEXIT:
+        import atexit
+
+        atexit.register(_flush_log)
+        _LOG_ATEXIT = True
+
+
+class _Phase:
+    """Adds the wall time of a with-block to _PHASES[name], in milliseconds."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "_Phase":
+        _flush_at_exit()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        ms = (time.perf_counter() - self.start) * 1000
+        _PHASES[self.name] = _PHASES.get(self.name, 0.0) + ms
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NO_PHASE = _NoPhase()
+
+
+def _phase(name: str) -> "_Phase | _NoPhase":
+    """Time a block as "<entry point>.<phase>" when timings are wanted."""
+    return _Phase(name) if _TIMING else _NO_PHASE
+
+
+def _mark_startup(entry: str, cpu_seconds: float) -> None:
+    """
+    Record the CPU time main() started at: everything since exec, i.e.
+    interpreter start-up plus imports.
+    """
+    if _TIMING:
+        _flush_at_exit()
+        _PHASES[f"{entry}.startup"] = cpu_seconds * 1000
+
+
+def _record_phases() -> None:
+    """Log and store the phase durations collected since the last call."""
+    if not _PHASES:
+        return
+    phases = {k: round(v, 3) for k, v in _PHASES.items()}
+    _PHASES.clear()
+    if _LOG_JSON:
+        _log("timings", level=INFO, phases_ms=phases)
+    elif INFO >= _LOG_LEVEL:
+        parts = " ".join(f"{k}={v}ms" for k, v in phases.items())
+        _log("timings: %s", parts, level=INFO)
+    if _METRICS:
+        _append_metrics(phases)
+
+
+def _rotate_log(incoming: int) -> None:
+    try:
+        size = os.path.getsize(LOG_FILE)
+    except OSError:
+        return
+    if size + incoming <= LOG_MAX_BYTES:
+        return
+    for n in range(LOG_BACKUPS - 1, 0, -1):
+        try:
+            os.replace(f"{LOG_FILE}.{n}", f"{LOG_FILE}.{n + 1}")
+        except OSError:
+            pass
+    try:
+        if LOG_BACKUPS > 0:
+            os.replace(LOG_FILE, f"{LOG_FILE}.1")
+        else:
+            os.unlink(LOG_FILE)
+    except OSError:
+        pass
+
+
+def _flush_log() -> None:
+    """Append every buffered record to LOG_FILE in one write."""
+    _record_phases()
+    if not _LOG_BUFFER or not LOG_FILE:
+        _LOG_BUFFER.clear()
+        return
+    records = _LOG_BUFFER[:]
+    del _LOG_BUFFER[: len(records)]  # daemon fetch threads may still append
+    data = "".join(records).encode("utf-8")
+    _rotate_log(len(data))
+    try:
+        fd = os.open(LOG_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+# ── Metrics ───────────────────────────────────────────────────────────────────
+# With METRICS on, every run appends one "<phase>\t<ms>" line per timed phase
+# to METRICS_JOURNAL in a single O_APPEND write, so concurrent keystrokes never
+# need a lock. Once the journal passes METRICS_FOLD_BYTES (and on --stats) it
+# is folded, under an flock, into per-phase histograms in METRICS_FILE whose
+# buckets grow by _METRIC_GROWTH from _METRIC_MIN_MS, so any percentile read
+# back is within ~10% of the true value.
+_METRIC_MIN_MS = 0.01
+_METRIC_GROWTH = 1.2
+_METRIC_BUCKETS = 100  # 0.01 ms ... ~10 min
+_METRICS_VERSION = 1
+
+
+def _metric_bucket(ms: float) -> int:
+    if ms <= _METRIC_MIN_MS:
+        return 0
+    i = math.ceil(math.log(ms / _METRIC_MIN_MS) / math.log(_METRIC_GROWTH))
+    return min(i, _METRIC_BUCKETS - 1)
+
+
+def _metric_bound(i: int) -> float:
+    """Upper edge of bucket i, in milliseconds."""
+    return _METRIC_MIN_MS * _METRIC_GROWTH**i
+
+
+def _append_metrics(phases: dict[str, float]) -> None:
+    data = "".join(f"{k}\t{v}\n" for k, v in phases.items()).encode()
+    flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+    # This runs from atexit too, so no failure may escape as a traceback
+    try:
+        try:
+            fd = os.open(METRICS_JOURNAL, flags, 0o600)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(METRICS_JOURNAL), exist_ok=True)
+            fd = os.open(METRICS_JOURNAL, flags, 0o600)
+    except OSError:
+        return
+    try:
+        os.write(fd, data)
+        size = os.fstat(fd).st_size
+    except OSError:
+        return
+    finally:
+        os.close(fd)
+    if size > METRICS_FOLD_BYTES:
+        try:
+            fold_metrics()
+        except OSError as e:
+            _log("metrics: fold failed %s: %s", type(e).__name__, e, level=WARNING)
+
+
+def _load_metrics() -> dict:
+    import json
+
+    try:
+        with open(METRICS_FILE, "r", encoding="utf-8") as f:
+            store = json.load(f)
+        if store.get("version") == _METRICS_VERSION:
+            return store
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {"version": _METRICS_VERSION, "phases": {}}
+
+
+def fold_metrics() -> dict:
+    """Merge METRICS_JOURNAL into the METRICS_FILE histograms and return them."""
+    import fcntl
+    import json
+
+    os.makedirs(os.path.dirname(METRICS_FILE), exist_ok=True)
+    with open(f"{METRICS_FILE}.lock", "w", encoding="utf-8") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        store = _load_metrics()
+        taken = f"{METRICS_JOURNAL}.{os.getpid()}"
+        try:
+            os.replace(METRICS_JOURNAL, taken)
+        except FileNotFoundError:
+            return store
+        with open(taken, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        for line in lines:
+            name, _, value = line.rstrip("\n").partition("\t")
+            try:
+                ms = float(value)
+            except ValueError:
+                continue
+            hist = store["phases"].setdefault(
+                name, {"count": 0, "sum": 0.0, "max": 0.0, "buckets": {}}
+            )
+            hist["count"] += 1
+            hist["sum"] += ms
+            hist["max"] = max(hist["max"], ms)
+            bucket = str(_metric_bucket(ms))
+            hist["buckets"][bucket] = hist["buckets"].get(bucket, 0) + 1
+        tmp = f"{METRICS_FILE}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(store, f)
+        os.replace(tmp, METRICS_FILE)
+        os.unlink(taken)
+    return store
+
+
+def _histogram_percentile(hist: dict, p: float) -> float:
+    """Upper edge of the bucket holding the p-th percentile sample."""
+    rank = max(1, math.ceil(hist["count"] * p / 100))
+    seen = 0
+    for i in sorted(int(b) for b in hist["buckets"]):
+        seen += hist["buckets"][str(i)]
+        if seen >= rank:
+            return min(_metric_bound(i), hist["max"])
+    return hist["max"]
+
+
+def print_stats() -> None:
+    """Print count, mean and p50/p95/p99/max per recorded phase."""
+    store = fold_metrics()
+    if not store["phases"]:
+        print(f"no metrics recorded yet (enable with --metrics); {METRICS_FILE}")
+        return
+    width = max(len(name) for name in store["phases"])
+    head = ("phase", "count", "mean", "p50", "p95", "p99", "max")
+    print(f"{head[0]:<{width}}  {head[1]:>7}" + "".join(f"{h:>10}" for h in head[2:]))
+    for name in sorted(store["phases"]):
+        hist = store["phases"][name]
+        cols = [hist["sum"] / hist["count"]]
+        cols += [_histogram_percentile(hist, p) for p in (50, 95, 99)]
+        cols.append(hist["max"])
+        print(
+            f"{name:<{width}}  {hist['count']:>7}"
+            + "".join(f"{c:>8.2f}ms" for c in cols)
+        )
+
+
+def _configure_log_from_env() -> None:
+    _configure_log(
+        os.environ.get("WEBSEARCH_LOG_LEVEL") or LOG_LEVEL,
+        os.environ.get("WEBSEARCH_LOG_FORMAT") or LOG_FORMAT,
+        os.environ.get("WEBSEARCH_METRICS", "1" if METRICS else "") == "1",
+    )
+
+
+_configure_log_from_env()
+
+
+# ── Bang registry ──────────────────────────────────────────────────────────────
+# The built-in BANGS plus any user bangs from BANGS_FILE, compiled once into a
+# lookup dict, a sorted hint list and a prefix trie whose nodes hold the
+# [lo, hi) slice of the hint list below them. The compiled registry is pickled
+# to BANGS_CACHE and reused until the user file or this script changes.
+#
+# BANGS_FILE is either tab-separated lines ("!bang<TAB>Label<TAB>URL with {}")
+# or, with a .json suffix, a DuckDuckGo-style dump: [{"t": "yt", "s": "YouTube",
+# "u": "https://www.youtube.com/results?search_query={{{s}}}"}, ...].
+BANGS_FILE = os.path.expanduser("~/.config/rofi-websearch/bangs.tsv")
+BANGS_CACHE = os.path.expanduser("~/.cache/rofi-websearch/bangs.pickle")
+_BANGS_CACHE_VERSION = 1
+
+
+class BangRegistry:
+    """Compiled bang table: O(1) lookup, O(len(prefix)) hint lookup."""
+
+    def __init__(self, bangs: dict[str, tuple[str, str]]) -> None:
+        self.bangs = {b.lower(): v for b, v in bangs.items()}
+        tokens = sorted(self.bangs)
+        self.hints = [(f"{b}  —  {self.bangs[b][0]}", b) for b in tokens]
+        # node = [children, lo, hi]
+        self._trie: list = [{}, 0, len(tokens)]
+        for i, token in enumerate(tokens):
+            node = self._trie
+            for ch in token:
+                child = node[0].get(ch)
+                if child is None:
+                    child = node[0][ch] = [{}, i, i]
+                child[2] = i + 1
+                node = child
+
+    def state(self) -> tuple:
+        """Plain-data form for pickling (independent of this module's name)."""
+        return self.bangs, self.hints, self._trie
+
+    @classmethod
+    def from_state(cls, state: tuple) -> "BangRegistry":
+        registry = cls.__new__(cls)
+        registry.bangs, registry.hints, registry._trie = state
+        return registry
+
+    def get(self, bang: str) -> "tuple[str, str] | None":
+        return self.bangs.get(bang)
+
+    def hints_for(self, prefix: str) -> list[tuple[str, str]]:
+        """Hint lines for every bang starting with prefix (all for '')."""
+        node = self._trie
+        for ch in prefix:
+            node = node[0].get(ch)
+            if node is None:
+                return []
+        return self.hints[node[1] : node[2]]
+
+
+def _read_bang_file(path: str) -> dict[str, tuple[str, str]]:
+    import json
+
+    bangs: dict[str, tuple[str, str]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            for item in json.load(f):
+                if isinstance(item, dict) and item.get("t") and item.get("u"):
+                    url = str(item["u"]).replace("{{{s}}}", "{}")
+                    bangs[f"!{item['t']}"] = (str(item.get("s") or item["t"]), url)
+            return bangs
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            parts = line.split("\t")
+            if len(parts) == 3 and parts[0].startswith("!") and "{}" in parts[2]:
+                bangs[parts[0].strip()] = (parts[1].strip(), parts[2].strip())
+    return bangs
+
+
+def load_bang_registry() -> BangRegistry:
+    """The compiled registry, from BANGS_CACHE when it is still current."""
+    import pickle
+
+    sig = (_BANGS_CACHE_VERSION, _file_sig(BANGS_FILE), _file_sig(__file__))
+    try:
+        with open(BANGS_CACHE, "rb") as f:
+            cached_sig, state = pickle.load(f)
+        if cached_sig == sig:
+            return BangRegistry.from_state(state)
+    except (OSError, pickle.PickleError, EOFError, ValueError, TypeError):
+        pass
+    bangs = dict(BANGS)
+    if sig[1] is not None:
+        try:
+            bangs.update(_read_bang_file(BANGS_FILE))
+        except (OSError, ValueError) as e:
+            _log("bangs: cannot read %s: %s", BANGS_FILE, e, level=WARNING)
+    registry = BangRegistry(bangs)
+    try:
+        os.makedirs(os.path.dirname(BANGS_CACHE), exist_ok=True)
+        tmp = f"{BANGS_CACHE}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((sig, registry.state()), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, BANGS_CACHE)
+    except OSError as e:
+        _log("bangs: cannot write %s: %s", BANGS_CACHE, e, level=WARNING)
+    return registry
+
+
+_REGISTRY: "BangRegistry | None" = None
+
+
+def _bangs() -> BangRegistry:
+    global _REGISTRY  # pylint: disable=global-statement
+    if _REGISTRY is None:
+        _REGISTRY = load_bang_registry()
+    return _REGISTRY
+
+
+# ── Bang helpers ───────────────────────────────────────────────────────────────
+
+
+def parse_bang(text: str) -> tuple[str | None, str]:
+    """
+    Split a query into (bang, rest).
+
+    Returns (None, text) when no recognised bang is present.
+    A bare bang with no query (e.g. "!yt") returns (bang, "").
+    """
+    text = text.strip()
+    if text.startswith("!"):
+        token, *rest = text.split(None, 1)
+        bang = token.lower()
+        if _bangs().get(bang) is not None:
+            return bang, rest[0].strip() if rest else ""
+    return None, text
+
+
+def bang_url(bang: str, query: str) -> str:
+    """Build the destination URL for a bang + query pair."""
+    import re
+    import urllib.parse
+
+    _, url_template = _bangs().bangs[bang]
+    if query:
+        return url_template.format(urllib.parse.quote_plus(query))
+    # No query — navigate to the site root
+    return re.sub(r"(https?://[^/]+).*", r"\1", url_template)
+
+
+def bang_hint_entries(query: str = "") -> list[tuple[str, str]]:
+    """Hint lines for the bangs matching a typed '!', '!!' or '!<partial>'."""
+    return _bangs().hints_for("" if query in ("", "!", "!!") else query.lower())
+
+
+def hint_bang(line: str) -> "str | None":
+    """The bang of a selected hint line ("!yt  —  YouTube"), else None."""
+    token, sep, _ = line.strip().partition("  —  ")
+    token = token.strip().lower()
+    if sep and _bangs().get(token) is not None:
+        return token
+    return None
+
+
+# ── Rofi script-mode protocol ─────────────────────────────────────────────────
+ROFI_PROMPT = "\0prompt\x1f"
+ROFI_MESSAGE = "\0message\x1f"
+ROFI_URGENT = "\0urgent\x1f"
+ROFI_ACTIVE = "\0active\x1f"
+ROFI_DELIM = "\0delim\x1f"
+ROFI_DATA = "\0data\x1f"  # handed back to the next run as $ROFI_DATA
+ROFI_NO_CUSTOM = "\0no-custom\x1ftrue\n"
+ROFI_MARKUP = "\0markup-rows\x1ftrue\n"
+
+# Sentinel entries
+HISTORY_ENTRY = "  :history"
+CLEAR_ALL = "  :clear-all"
+CONFIRM_YES = "  Yes — delete everything"
+CONFIRM_NO = "  No — cancel"
+
+# ── URL detection ─────────────────────────────────────────────────────────────
+_URL_RE = r"^(https?://|ftp://)|^([\w-]+\.)+[\w]{2,}(/|$)|^localhost(:\d+)?(/|$)"
+
+
+def looks_like_url(text: str) -> bool:
+    import re
+
+    return bool(re.match(_URL_RE, text.strip(), re.IGNORECASE))
+
+
+def normalise_url(text: str) -> str:
+    import re
+
+    text = text.strip()
+    if not re.match(r"^[a-zA-Z][a-zA-Z0-9+\-.]*://", text):
+        text = "https://" + text
+    return text
+
+
+# ── State management ──────────────────────────────────────────────────────────
+# The current menu ("search", "history" or "confirm") travels with rofi itself:
+# every script-mode run prints it as \0data and rofi passes it to the next run
+# in $ROFI_DATA, so a keystroke never touches the filesystem for it.
+#
+# launch_rofi also needs the mode after rofi exits (Esc in the history menu
+# reopens the search bar), so mode *changes* are mirrored to a file named after
+# the WEBSEARCH_SESSION id it hands to rofi. That file is also the fallback for
+# rofi versions without ROFI_DATA.
+MODES = ("search", "history", "confirm")
+
+
+def _private_dir(path: str) -> str:
+    """
+    path, created as a 0700 directory if missing. Raises PermissionError when it
+    is anything else: under /tmp another user could have made it first.
+    """
+    import stat
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a private directory of this user")
+    return path
+
+
+def _session_file(session: "str | None" = None) -> "str | None":
+    session = session or os.environ.get("WEBSEARCH_SESSION")
+    if not session:
+        return None
+    try:
+        return os.path.join(_private_dir(SESSION_DIR), f"{session}.mode")
+    except OSError as e:
+        _log("session: %s", e, level=WARNING)
+        return None
+
+
+def _read_session_mode(path: "str | None") -> str:
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                mode = f.read().strip()
+            if mode in MODES:
+                return mode
+        except OSError:
+            pass
+    return "search"
+
+
+def get_mode() -> str:
+    data = os.environ.get("ROFI_DATA")
+    if data in MODES:
+        return data
+    return _read_session_mode(_session_file())
+
+
+def set_mode(mode: str) -> None:
+    """Switch the running rofi session to mode, from inside script mode."""
+    sys.stdout.write(f"{ROFI_DATA}{mode}\n")
+    path = _session_file()
+    if path and mode != get_mode():
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(mode)
+        except OSError as e:
+            _log("session: cannot write %s: %s", path, e, level=WARNING)
+
+
+# ── History ───────────────────────────────────────────────────────────────────
+# history.txt is an append-only journal, oldest line first:
+#   "<timestamp>\t<entry>"  records a visit
+#   "-\t<entry>"            tombstone: forget every earlier visit of <entry>
+# Reading replays it newest-first with dedup; once the journal holds more than
+# HISTORY_COMPACT_LINES lines it is rewritten with one line per live entry.
+HISTORY_TOMBSTONE = "-"
+HISTORY_COMPACT_LINES = 2 * MAX_HISTORY
+
+# path -> ((mtime_ns, size), entries, journal_lines); skips unchanged re-reads
+_HISTORY_MEMO: dict[str, tuple[tuple[int, int], list[tuple[str, str]], int]] = {}
+
+
+def _file_sig(path: str) -> "tuple[int, int] | None":
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_journal(path: str) -> tuple[list[tuple[str, str]], int]:
+    """Replay the journal into (newest-first deduplicated entries, line count)."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    seen: set[str] = set()
+    entries: list[tuple[str, str]] = []
+    for line in reversed(lines):
+        if "\t" in line:
+            ts, entry = line.split("\t", 1)
+        else:
+            ts, entry = "", line
+        if not entry or entry in seen:
+            continue
+        seen.add(entry)
+        if ts != HISTORY_TOMBSTONE:
+            entries.append((entry, ts))
+            if len(entries) >= MAX_HISTORY:
+                break
+    return entries, len(lines)
+
+
+def load_history(path: str) -> list[tuple[str, str]]:
+    sig = _file_sig(path)
+    if sig is None:
+        return []
+    memo = _HISTORY_MEMO.get(path)
+    if memo and memo[0] == sig:
+        return memo[1]
+    entries, nlines = _read_journal(path)
+    _HISTORY_MEMO[path] = (sig, entries, nlines)
+    return entries
+
+
+def _append_journal(
+    path: str,
+    line: str,
+    before: list[tuple[str, str]],
+    after: "list[tuple[str, str]] | None",
+) -> list[tuple[str, str]]:
+    """
+    Durably append one journal line and return the resulting history.
+
+    after is the caller's prediction of the new history, or None when only a
+    replay can tell (a tombstone may let an entry past MAX_HISTORY resurface).
+    The journal is compacted instead once it exceeds HISTORY_COMPACT_LINES.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    memo = _HISTORY_MEMO.get(path)
+    if memo is None or memo[1] is not before or memo[0] != _file_sig(path):
+        load_history(path)
+        memo = _HISTORY_MEMO.get(path)
+    nlines = (memo[2] if memo else 0) + 1
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+    sig = _file_sig(path)
+    if after is None or sig is None:
+        after = load_history(path)
+    else:
+        _HISTORY_MEMO[path] = (sig, after, nlines)
+    if nlines > HISTORY_COMPACT_LINES:
+        _write_history(path, after)
+    return after
+
+
+def save_history(
+    path: str, entry: str, existing: list[tuple[str, str]]
+) -> list[tuple[str, str]]:
+    from datetime import datetime
+
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M")
+    new_entries = [(entry, ts)]
+    for e, t in existing:
+        if len(new_entries) >= MAX_HISTORY:
+            break
+        if e != entry:
+            new_entries.append((e, t))
+    _record_visit(path, entry)
+    new_entries = _append_journal(path, f"{ts}\t{entry}\n", existing, new_entries)
+    update_trigram_index(path)
+    return new_entries
+
+
+def delete_entry(
+    path: str, entry: str, existing: list[tuple[str, str]]
+) -> list[tuple[str, str]]:
+    new_entries = _append_journal(
+        path, f"{HISTORY_TOMBSTONE}\t{entry}\n", existing, None
+    )
+    update_trigram_index(path)
+    return new_entries
+
+
+def clear_all_history(path: str) -> None:
+    import contextlib
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for p in (path, _rank_path(path)):
+        with open(p, "w", encoding="utf-8"):
+            pass
+    _HISTORY_MEMO.pop(path, None)
+    _TRIGRAM_MEMO.pop(path, None)
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(_index_path(path))
+
+
+def _write_history(path: str, entries: list[tuple[str, str]]) -> None:
+    """Atomically rewrite the journal with one line per live entry (compaction)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for e, ts in reversed(entries):
+            f.write(f"{ts}\t{e}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    index = None
+    if path in _TRIGRAM_MEMO or os.path.exists(_index_path(path)):
+        index = load_trigram_index(path)  # caught up with the old journal
+    os.replace(tmp, path)
+    sig = _file_sig(path)
+    if sig is not None:
+        _HISTORY_MEMO[path] = (sig, entries, len(entries))
+    _compact_ranks(path, entries)
+    if index is not None:
+        # Same live set, new file: rebase instead of re-tokenising everything
+        index.trim(len(entries))
+        index.compact()
+        st = os.stat(path)
+        index.journal_ino, index.journal_offset = st.st_ino, st.st_size
+        index.dump(_index_path(path))
+    _log("history: compacted %s to %d lines", path, len(entries), level=INFO)
+
+
+# ── Frecency ──────────────────────────────────────────────────────────────────
+# Each entry's frecency is Σ 2^(-age/half-life) over its visits. It is stored
+# in log space, score = ln Σ exp(λ·t_visit) with λ = ln 2 / half-life, which
+# orders entries exactly like the decayed sum at any moment but never needs
+# rescaling: a visit at time t updates it to logaddexp(score, λ·t). Scores live
+# in an append-only sidecar ("<score>\t<entry>", last line wins) next to
+# history.txt and are compacted together with it.
+FRECENCY_HALF_LIFE = 14 * 24 * 3600
+_FRECENCY_RATE = math.log(2) / FRECENCY_HALF_LIFE
+RANKS = ("recency", "frecency")
+
+# rank path -> ((mtime_ns, size), scores)
+_RANK_MEMO: dict[str, tuple[tuple[int, int], dict[str, float]]] = {}
+
+
+def _rank_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".rank"
+
+
+def _logaddexp(a: float, b: float) -> float:
+    if a == -math.inf:
+        return b
+    hi, lo = (a, b) if a > b else (b, a)
+    return hi + math.log1p(math.exp(lo - hi))
+
+
+def load_ranks(path: str) -> dict[str, float]:
+    """entry -> log-space frecency score for the history file at path."""
+    rpath = _rank_path(path)
+    sig = _file_sig(rpath)
+    if sig is None:
+        return {}
+    memo = _RANK_MEMO.get(rpath)
+    if memo and memo[0] == sig:
+        return memo[1]
+    scores: dict[str, float] = {}
+    with open(rpath, "r", encoding="utf-8") as f:
+        for line in f:
+            score, _, entry = line.rstrip("\n").partition("\t")
+            try:
+                scores[entry] = float(score)
+            except ValueError:
+                continue
+    _RANK_MEMO[rpath] = (sig, scores)
+    return scores
+
+
+def _record_visit(path: str, entry: str) -> None:
+    """Fold one visit into entry's frecency with a single appended line."""
+    scores = load_ranks(path)
+    score = _logaddexp(scores.get(entry, -math.inf), _FRECENCY_RATE * time.time())
+    rpath = _rank_path(path)
+    os.makedirs(os.path.dirname(rpath), exist_ok=True)
+    with open(rpath, "a", encoding="utf-8") as f:
+        f.write(f"{score!r}\t{entry}\n")
+    scores[entry] = score
+    sig = _file_sig(rpath)
+    if sig is not None:
+        _RANK_MEMO[rpath] = (sig, scores)
+
+
+def _compact_ranks(path: str, entries: list[tuple[str, str]]) -> None:
+    """Rewrite the score sidecar with one line per live history entry."""
+    scores = load_ranks(path)
+    rpath = _rank_path(path)
+    os.makedirs(os.path.dirname(rpath), exist_ok=True)
+    tmp = f"{rpath}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for e, _ in entries:
+            if e in scores:
+                f.write(f"{scores[e]!r}\t{e}\n")
+    os.replace(tmp, rpath)
+    _RANK_MEMO.pop(rpath, None)
+
+
+def _ts_score(ts: str) -> float:
+    """Score for an entry with no recorded visits: one visit at its timestamp."""
+    from datetime import datetime
+
+    try:
+        return _FRECENCY_RATE * datetime.strptime(ts, "%Y-%m-%d %H:%M").timestamp()
+    except ValueError:
+        return -math.inf
+
+
+def rank_history(
+    path: str, history: list[tuple[str, str]], rank: str
+) -> list[tuple[str, str]]:
+    """history reordered for display; recency order is the journal's own."""
+    if rank != "frecency":
+        return history
+    scores = load_ranks(path)
+    return sorted(history, key=lambda h: -scores.get(h[0], _ts_score(h[1])))
+
+
+# ── History snapshot ──────────────────────────────────────────────────────────
+# A compact binary copy of the replayed history, kept next to history.txt (one
+# file per rank order) and revalidated against the (mtime_ns, size) of the
+# journal and of the frecency sidecar. Layout:
+#   header   <8s q q q q I 4x>  magic, journal sig, sidecar sig, row count
+#   offsets  uint32 × (count + 1) into the blob
+#   blob     rows in display order, preformatted as rofi lines ("entry\0meta\x1fts\n")
+#   loffsets uint32 × (count + 1) into the lowercase blob
+#   lblob    the same entries lowercased, one per "\n"-terminated line
+# script_mode mmaps it and streams the blob straight to stdout, so rendering
+# history costs neither parsing nor per-entry Python objects; the lowercase
+# blob lets server-side filtering search every entry with C-level scans.
+HISTORY_SNAPSHOT = True
+_SNAP_MAGIC = b"RWSSNAP3"
+_SNAP_HEADER = struct.Struct("<8sqqqqI4x")
+
+# snapshot path -> open snapshot, reused by the daemon while still valid
+_SNAPSHOT_MEMO: dict[str, "HistorySnapshot"] = {}
+
+
+def _snapshot_path(path: str, rank: str = "recency") -> str:
+    suffix = ".snap" if rank == "recency" else f".{rank}.snap"
+    return os.path.splitext(path)[0] + suffix
+
+
+def _rofi_row(entry: str, ts: str) -> bytes:
+    """The exact bytes print_option(entry, meta=ts) writes."""
+    return (f"{entry}\0meta\x1f{ts}\n" if ts else f"{entry}\n").encode("utf-8")
+
+
+class HistorySnapshot:
+    """Read-only mmap view of a history snapshot; iterates as (entry, ts)."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, *sig, count = _SNAP_HEADER.unpack_from(self._mm, 0)
+        if magic != _SNAP_MAGIC:
+            raise ValueError(f"not a history snapshot: {path}")
+        self.source_sig = tuple(sig)
+        self._count = count
+        self._offsets = memoryview(self._mm)[
+            _SNAP_HEADER.size : _SNAP_HEADER.size + 4 * (count + 1)
+        ].cast("I")
+        self._base = _SNAP_HEADER.size + 4 * (count + 1)
+        lstart = self._base + self._offsets[count]
+        self._loffsets = memoryview(self._mm)[
+            lstart : lstart + 4 * (count + 1)
+        ].cast("I")
+        self._lbase = lstart + 4 * (count + 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def row(self, i: int) -> bytes:
+        start = self._base + self._offsets[i]
+        return self._mm[start : self._base + self._offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(self._count):
+            text = self.row(i)[:-1].decode("utf-8")
+            entry, _, ts = text.partition("\0meta\x1f")
+            yield entry, ts
+
+    def _find(self, entry: str) -> "tuple[int, int] | None":
+        """Byte range of entry's row within the blob, found with a C-level scan."""
+        needle = entry.encode("utf-8")
+        end = self._base + self._offsets[self._count]
+        for tail in (b"\0", b"\n"):
+            if self._count and self._mm[self._base : self._base + len(needle) + 1] == (
+                needle + tail
+            ):
+                return 0, self._offsets[1]
+            pos = self._mm.find(b"\n" + needle + tail, self._base, end)
+            if pos >= 0:
+                start = pos + 1
+                stop = self._mm.find(b"\n", start + len(needle), end) + 1
+                return start - self._base, stop - self._base
+        return None
+
+    def lower(self, i: int) -> str:
+        """Lowercased entry of row i."""
+        start = self._lbase + self._loffsets[i]
+        return self._mm[start : self._lbase + self._loffsets[i + 1] - 1].decode("utf-8")
+
+    def _line_at(self, pos: int) -> int:
+        """Row index owning absolute offset pos in the lowercase blob."""
+        return bisect.bisect_right(self._loffsets, pos - self._lbase) - 1
+
+    def match(self, query: str, limit: int) -> list[int]:
+        """
+        Row indices of the best limit matches for query, best first.
+
+        Candidates come from scanning the lowercase blob for the query's
+        longest token; a fuzzy subsequence regex over the same blob tops the
+        list up when substring matches run short.
+        """
+        q = query.lower().strip()
+        tokens = q.split()
+        if not tokens:
+            return list(range(min(limit, self._count)))
+        end = self._lbase + self._loffsets[self._count]
+        needle = max(tokens, key=len).encode("utf-8")
+        tiers: dict[int, int] = {}
+        pos = self._mm.find(needle, self._lbase, end)
+        while pos >= 0 and len(tiers) < FILTER_SCAN_LIMIT:
+            i = self._line_at(pos)
+            tier = _match_tier(self.lower(i), q, tokens)
+            if tier is not None:
+                tiers[i] = tier
+            pos = self._mm.find(needle, self._lbase + self._loffsets[i + 1], end)
+        ranked = sorted(tiers, key=lambda i: (tiers[i], i))[:limit]
+        if len(ranked) < limit:
+            pattern = _fuzzy_pattern(q.encode("utf-8"))
+            for m in pattern.finditer(self._mm, self._lbase, end):
+                i = self._line_at(m.start())
+                if i not in tiers:
+                    tiers[i] = _TIER_FUZZY
+                    ranked.append(i)
+                    if len(ranked) >= limit:
+                        break
+        return ranked
+
+    def write_matches(self, query: str, limit: int) -> None:
+        """Write the best matching rows for query, tagged so rofi keeps them."""
+        needle = query.encode("utf-8")
+        tag = query.strip().encode("utf-8")
+        out = []
+        for i in self.match(query, limit + 1):
+            row = self.row(i)
+            if row.startswith(needle) and row[len(needle) : len(needle) + 1] in (
+                b"\0",
+                b"\n",
+            ):
+                continue
+            out.append(_tag_row(row, tag))
+        _write_raw(b"".join(out[:limit]))
+
+    def write_rows(self, skip: str = "") -> None:
+        """Write every row to stdout, leaving out the one whose entry is skip."""
+        blob = memoryview(self._mm)[
+            self._base : self._base + self._offsets[self._count]
+        ]
+        cut = self._find(skip) if skip else None
+        if cut is None:
+            _write_raw(blob)
+        else:
+            _write_raw(blob[: cut[0]])
+            _write_raw(blob[cut[1] :])
+
+
+def _offsets_of(chunks: list[bytes]) -> array.array:
+    offsets = array.array("I", [0])
+    for c in chunks:
+        offsets.append(offsets[-1] + len(c))
+    return offsets
+
+
+def _write_snapshot(snap: str, sig: tuple[int, ...], entries) -> None:
+    rows = [_rofi_row(e, ts) for e, ts in entries]
+    lowered = [f"{e.lower()}\n".encode("utf-8") for e, _ in entries]
+    tmp = f"{snap}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_SNAP_HEADER.pack(_SNAP_MAGIC, *sig, len(rows)))
+        f.write(_offsets_of(rows).tobytes())
+        f.write(b"".join(rows))
+        f.write(_offsets_of(lowered).tobytes())
+        f.write(b"".join(lowered))
+    os.replace(tmp, snap)
+
+
+# ── Server-side filtering ─────────────────────────────────────────────────────
+# With --filter server, search.py ranks history against the typed query itself
+# and emits only the best FILTER_TOP_N rows. Each emitted row carries the query
+# in its meta field, which rofi matches too, so rofi's own pass keeps them all.
+FILTERS = ("rofi", "server")
+FILTER_TOP_N = 40
+FILTER_SCAN_LIMIT = 5000  # substring candidates examined before ranking
+
+# Match tiers, best first: prefix, whole-query substring, every token, fuzzy
+_TIER_FUZZY = 3
+
+
+def _match_tier(line: str, q: str, tokens: list[str]) -> "int | None":
+    if line.startswith(q):
+        return 0
+    if q in line:
+        return 1
+    if all(t in line for t in tokens):
+        return 2
+    return None
+
+
+def _fuzzy_pattern(q: bytes) -> "re.Pattern[bytes]":
+    """Subsequence matcher for q that never crosses a line break."""
+    import re
+
+    chars = [q[i : i + 1] for i in range(len(q)) if not q[i : i + 1].isspace()]
+    return re.compile(b"[^\n]*?".join(re.escape(c) for c in chars))
+
+
+def _tag_row(row: bytes, tag: bytes) -> bytes:
+    """Append tag to a rofi row's meta field (adding one if needed)."""
+    body = row[:-1]
+    if b"\0meta\x1f" in body:
+        return body + b" " + tag + b"\n"
+    return body + b"\0meta\x1f" + tag + b"\n"
+
+
+def filter_history(
+    history: list[tuple[str, str]], query: str, limit: int
+) -> list[tuple[str, str]]:
+    """List counterpart of HistorySnapshot.match for snapshot-less rendering."""
+    q = query.lower().strip()
+    tokens = q.split()
+    if not tokens:
+        return history[:limit]
+    tiers = []
+    for i, (e, ts) in enumerate(history):
+        tier = _match_tier(e.lower(), q, tokens)
+        if tier is not None:
+            tiers.append((tier, i))
+    picked = [i for _, i in sorted(tiers)[:limit]]
+    if len(picked) < limit:
+        pattern = _fuzzy_pattern(q.encode("utf-8"))
+        seen = set(picked)
+        for i, (e, _) in enumerate(history):
+            if i not in seen and pattern.search(e.lower().encode("utf-8")):
+                picked.append(i)
+                if len(picked) >= limit:
+                    break
+    return [history[i] for i in picked]
+
+
+def load_history_view(
+    path: str, rank: str = "recency"
+) -> "HistorySnapshot | list[tuple[str, str]]":
+    """
+    History for rendering in rank order: the mmap snapshot when enabled and
+    current (rebuilding it when stale), else the ranked load_history().
+    """
+    if not HISTORY_SNAPSHOT:
+        return rank_history(path, load_history(path), rank)
+    hsig = _file_sig(path)
+    if hsig is None:
+        return []
+    rsig = (_file_sig(_rank_path(path)) or (0, 0)) if rank == "frecency" else (0, 0)
+    sig = (*hsig, *rsig)
+    snap_path = _snapshot_path(path, rank)
+    snap = _SNAPSHOT_MEMO.get(snap_path)
+    if snap is None or snap.source_sig != sig:
+        try:
+            snap = HistorySnapshot(snap_path)
+        except (OSError, ValueError, struct.error):
+            snap = None
+    if snap is None or snap.source_sig != sig:
+        entries = rank_history(path, load_history(path), rank)
+        try:
+            _write_snapshot(snap_path, sig, entries)
+            snap = HistorySnapshot(snap_path)
+        except (OSError, ValueError) as e:
+            _log("history: snapshot unavailable %s", e, level=WARNING)
+            return entries
+    _SNAPSHOT_MEMO[snap_path] = snap
+    return snap
+
+
+# ── Trigram index ─────────────────────────────────────────────────────────────
+# history.tri maps every lowercase trigram to the ids of the live entries that
+# contain it. Ids grow with each visit, so descending id is recency order, and
+# compaction renumbers them densely so the index stays sized to the live set.
+# The index remembers the journal's inode and the byte offset it has consumed:
+# whoever loads it catches it up by replaying only the journal lines past that
+# offset (at most HISTORY_COMPACT_LINES), and compaction rebases it onto the
+# rewritten journal. Queries intersect the posting sets of the query's trigrams
+# and then verify the candidates. Renders do not consult it: at MAX_HISTORY
+# entries one snapshot scan takes well under a millisecond (search_bench.py),
+# and only a history of thousands of entries leaves the index anything to save.
+_TRIGRAM_VERSION = 1
+
+# journal path -> loaded index, kept by the daemon between renders
+_TRIGRAM_MEMO: dict[str, "TrigramIndex"] = {}
+
+
+def _index_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".tri"
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Incrementally maintained trigram → entry-id postings over history."""
+
+    def __init__(self) -> None:
+        self.docs: list["tuple[str, str] | None"] = []  # id -> (entry, ts)
+        self.ids: dict[str, int] = {}
+        self.postings: dict[str, set[int]] = {}
+        self.journal_ino = 0
+        self.journal_offset = 0
+
+    def add(self, entry: str, ts: str) -> None:
+        self.remove(entry)
+        doc_id = len(self.docs)
+        self.docs.append((entry, ts))
+        self.ids[entry] = doc_id
+        for gram in _trigrams(entry.lower()):
+            self.postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, entry: str) -> None:
+        doc_id = self.ids.pop(entry, None)
+        if doc_id is None:
+            return
+        self.docs[doc_id] = None
+        for gram in _trigrams(entry.lower()):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def entries(self) -> list[tuple[str, str]]:
+        """Live entries, newest first — the order load_history() returns."""
+        return [d for d in reversed(self.docs) if d is not None]
+
+    def trim(self, limit: int) -> None:
+        """Forget the oldest entries beyond limit, as the journal replay does."""
+        excess = len(self.ids) - limit
+        for doc in self.docs:
+            if excess <= 0:
+                break
+            if doc is not None:
+                self.remove(doc[0])
+                excess -= 1
+
+    def compact(self) -> None:
+        """Renumber the live entries 0..n-1, keeping their order."""
+        remap = {}
+        docs = []
+        for old, doc in enumerate(self.docs):
+            if doc is not None:
+                remap[old] = len(docs)
+                docs.append(doc)
+        self.docs = docs
+        self.ids = {d[0]: i for i, d in enumerate(docs)}
+        self.postings = {
+            gram: {remap[i] for i in ids} for gram, ids in self.postings.items()
+        }
+
+    def apply_journal(self, path: str) -> int:
+        """Replay journal lines past journal_offset; returns lines applied."""
+        with open(path, "rb") as f:
+            f.seek(self.journal_offset)
+            tail = f.read()
+        end = tail.rfind(b"\n") + 1  # ignore a half-written last line
+        lines = tail[:end].decode("utf-8").splitlines()
+        for line in lines:
+            ts, sep, entry = line.partition("\t")
+            if not sep:
+                ts, entry = "", line
+            if not entry:
+                continue
+            if ts == HISTORY_TOMBSTONE:
+                self.remove(entry)
+            else:
+                self.add(entry, ts)
+        self.journal_offset += end
+        self.trim(MAX_HISTORY)
+        return len(lines)
+
+    def search(
+        self, query: str, limit: int, order: "dict[str, float] | None" = None
+    ) -> "list[tuple[str, str]] | None":
+        """
+        Best limit entries for query (tier, then order score or recency).
+        None when no query token is long enough to use the index.
+        """
+        q = query.lower().strip()
+        tokens = q.split()
+        grams = set().union(*(_trigrams(t) for t in tokens)) if tokens else set()
+        if not grams:
+            return None
+        postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates &= ids
+            if not candidates:
+                return []
+        scored = []
+        for doc_id in candidates:
+            entry, _ = self.docs[doc_id]  # type: ignore[misc]
+            tier = _match_tier(entry.lower(), q, tokens)
+            if tier is None:
+                continue
+            rank = -order.get(entry, -math.inf) if order is not None else 0.0
+            scored.append(((tier, rank, -doc_id), doc_id))
+        scored.sort()
+        return [self.docs[i] for _, i in scored[:limit]]  # type: ignore[misc]
+
+    def dump(self, path: str) -> None:
+        import marshal
+
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump(
+                (
+                    _TRIGRAM_VERSION,
+                    self.journal_ino,
+                    self.journal_offset,
+                    self.docs,
+                    self.postings,
+                ),
+                f,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TrigramIndex":
+        import marshal
+
+        with open(path, "rb") as f:
+            version, ino, offset, docs, postings = marshal.load(f)
+        if version != _TRIGRAM_VERSION:
+            raise ValueError(f"unsupported trigram index version {version}")
+        index = cls()
+        index.journal_ino, index.journal_offset = ino, offset
+        index.docs = [tuple(d) if d is not None else None for d in docs]
+        index.ids = {d[0]: i for i, d in enumerate(index.docs) if d is not None}
+        index.postings = postings
+        return index
+
+
+def rebuild_trigram_index(path: str) -> TrigramIndex:
+    """Build the index from scratch from the replayed journal and persist it."""
+    index = TrigramIndex()
+    for entry, ts in reversed(load_history(path)):
+        index.add(entry, ts)
+    st = os.stat(path) if os.path.exists(path) else None
+    index.journal_ino = st.st_ino if st else 0
+    index.journal_offset = st.st_size if st else 0
+    index.dump(_index_path(path))
+    _TRIGRAM_MEMO[path] = index
+    _log(
+        "trigram: rebuilt %s with %d entries",
+        _index_path(path),
+        len(index.ids),
+        level=INFO,
+    )
+    return index
+
+
+def load_trigram_index(path: str) -> TrigramIndex:
+    """The index for path, caught up with the journal (rebuilt if unusable)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return TrigramIndex()
+    index = _TRIGRAM_MEMO.get(path)
+    if index is None or index.journal_ino != st.st_ino:
+        try:
+            index = TrigramIndex.load(_index_path(path))
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            _log("trigram: rebuilding (%s: %s)", type(e).__name__, e, level=WARNING)
+            return rebuild_trigram_index(path)
+    if index.journal_ino != st.st_ino or index.journal_offset > st.st_size:
+        return rebuild_trigram_index(path)
+    # The replayed tail is not dumped back: it stays short, since compaction
+    # rebases and rewrites the file, and re-dumping on every visit would make
+    # each save cost as much as the whole index
+    if index.journal_offset < st.st_size:
+        index.apply_journal(path)
+    elif len(index.ids) > MAX_HISTORY:  # MAX_HISTORY was lowered since the build
+        index.trim(MAX_HISTORY)
+        index.dump(_index_path(path))
+    _TRIGRAM_MEMO[path] = index
+    return index
+
+
+def update_trigram_index(path: str) -> None:
+    """Fold the latest journal lines into the in-memory index, if there is one."""
+    if path in _TRIGRAM_MEMO:
+        load_trigram_index(path)
+
+
+def check_trigram_index(path: str) -> list[str]:
+    """Differences between the persisted index and the journal; [] if consistent."""
+    index = load_trigram_index(path)
+    expected = load_history(path)
+    actual = index.entries()
+    problems = []
+    missing = {e for e, _ in expected} - set(index.ids)
+    extra = set(index.ids) - {e for e, _ in expected}
+    if missing:
+        problems.append(f"{len(missing)} entries missing from the index")
+    if extra:
+        problems.append(f"{len(extra)} entries indexed but not in history")
+    if not missing and not extra and actual != expected:
+        problems.append("entry order or timestamps differ from history")
+    fresh = TrigramIndex()
+    for entry, ts in reversed(expected):
+        fresh.add(entry, ts)
+    for gram, ids in fresh.postings.items():
+        want = {fresh.docs[i][0] for i in ids}  # type: ignore[index]
+        have = {
+            index.docs[i][0]  # type: ignore[index]
+            for i in index.postings.get(gram, ())
+        }
+        if want != have:
+            problems.append(f"posting list for {gram!r} is out of date")
+            break
+    return problems
+
+
+# ── Completions ───────────────────────────────────────────────────────────────
+CACHE_DB = os.path.expanduser("~/.cache/rofi-websearch/completions.db")
+
+
+def _cache_key(query: str, engine: str) -> str:
+    return f"{engine}:{query.lower().strip()}"
+
+
+class CompletionCache:
+    """
+    Completion cache stored as one SQLite row per key.
+
+    Each row keeps its suggestions, when they were fetched and when they were
+    last read. Reads and writes touch a single row; expired rows are dropped
+    on access and the least recently used rows are evicted whenever the cache
+    grows past CACHE_MAX_ENTRIES or CACHE_MAX_BYTES.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = CACHE_TTL,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+    ) -> None:
+        import sqlite3
+        import threading
+
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(
+            path, timeout=0.5, isolation_level=None, check_same_thread=False
+        )
+        self._db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                key      TEXT PRIMARY KEY,
+                items    TEXT NOT NULL,
+                fetched  REAL NOT NULL,
+                accessed REAL NOT NULL,
+                size     INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+            """
+        )
+
+    def get(self, key: str) -> "tuple[list[str], float] | None":
+        """(suggestions, fetched_at) for key, refreshing its recency; None on miss."""
+        import json
+
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT items, fetched FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._db.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0]), row[1]
+
+    def put(self, key: str, items: list[str]) -> None:
+        """Store items for key and evict down to the configured budget."""
+        import json
+
+        blob = json.dumps(items)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, blob, now, now, len(key) + len(blob)),
+            )
+            self._evict(now)
+
+    def put_many(self, entries: dict[str, list[str]]) -> None:
+        """Store several keys in one transaction, then evict once."""
+        import json
+
+        now = time.time()
+        rows = []
+        for key, items in entries.items():
+            blob = json.dumps(items)
+            rows.append((key, blob, now, now, len(key) + len(blob)))
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._evict(now)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def nearest(self, key: str, min_len: int) -> "tuple[str, list[str]] | None":
+        """
+        Closest cached relative of key: the longest cached prefix of it, or the
+        shortest cached key it is a prefix of, whichever differs by fewer
+        characters. Prefixes shorter than min_len are not considered.
+        """
+        import json
+
+        cutoff = time.time() - self.ttl
+        ancestors = [key[:n] for n in range(min_len, len(key))]
+        with self._lock:
+            above = self._db.execute(
+                "SELECT key, items FROM entries WHERE key > ? AND key < ? "
+                "AND fetched >= ? ORDER BY length(key) LIMIT 1",
+                (key, key + "\U0010ffff", cutoff),
+            ).fetchone()
+            below = None
+            if ancestors:
+                marks = ",".join("?" * len(ancestors))
+                below = self._db.execute(
+                    f"SELECT key, items FROM entries WHERE key IN ({marks}) "
+                    "AND fetched >= ? ORDER BY length(key) DESC LIMIT 1",
+                    (*ancestors, cutoff),
+                ).fetchone()
+        candidates = [r for r in (above, below) if r is not None]
+        if not candidates:
+            return None
+        best = min(candidates, key=lambda r: abs(len(r[0]) - len(key)))
+        return best[0], json.loads(best[1])
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM entries WHERE fetched < ?", (now - self.ttl,))
+        count, total = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        drop, freed = 0, 0
+        for (size,) in self._db.execute("SELECT size FROM entries ORDER BY accessed"):
+            if count - drop <= self.max_entries and total - freed <= self.max_bytes:
+                break
+            drop += 1
+            freed += size
+        self._db.execute(
+            "DELETE FROM entries WHERE key IN "
+            "(SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+            (drop,),
+        )
+
+
+_CACHE: "CompletionCache | None" = None
+
+
+def _cache() -> "CompletionCache | None":
+    """Process-wide cache handle; None when the database can't be opened."""
+    import sqlite3
+
+    global _CACHE  # pylint: disable=global-statement
+    if _CACHE is None:
+        try:
+            _CACHE = CompletionCache(CACHE_DB)
+        except sqlite3.Error as e:
+            _log("cache: cannot open %s: %s", CACHE_DB, e, level=ERROR)
+    return _CACHE
+
+
+def _read_cache(key: str) -> tuple[list[str], float]:
+    """(suggestions, fetched_at) for key; ([], 0.0) on miss or error."""
+    import sqlite3
+
+    cache = _cache()
+    try:
+        hit = cache.get(key) if cache else None
+    except (sqlite3.Error, ValueError) as e:
+        _log("_read_cache: error %s", e, level=WARNING)
+        hit = None
+    return hit or ([], 0.0)
+
+
+def _derived_completions(query: str, engine: str) -> list[str]:
+    """
+    Approximate completions for an uncached query, borrowed from the nearest
+    cached shorter or longer query and filtered to those still matching.
+    """
+    import sqlite3
+
+    cache = _cache()
+    key = _cache_key(query, engine)
+    try:
+        hit = cache.nearest(key, len(_cache_key("", engine)) + 3) if cache else None
+    except (sqlite3.Error, ValueError) as e:
+        _log("_derived_completions: error %s", e, level=WARNING)
+        return []
+    if hit is None:
+        return []
+    q = query.lower().strip()
+    items = [s for s in hit[1] if s.lower().startswith(q) and s.lower() != q]
+    _log("completions: derived %s for %r from %r", items, query, hit[0])
+    return items[:MAX_COMPLETIONS]
+
+
+def _write_cache(key: str, items: list[str]) -> None:
+    import sqlite3
+
+    cache = _cache()
+    if cache is None:
+        return
+    try:
+        cache.put(key, items)
+    except sqlite3.Error as e:
+        _log("_write_cache: error %s", e, level=WARNING)
+
+
+# ── Local completions ─────────────────────────────────────────────────────────
+# Offline phrase indexes over bookmark titles and history entries, plus the
+# word n-grams that recur across several of them. Each phrase is filed under its
+# lowercase text and every word start inside it (URLs also without their scheme)
+# in one sorted key list, so a prefix lookup is a bisect plus a short scan.
+# Bookmarks and history get one index each, merged by score at lookup time, so
+# a search (which changes history) re-mines only the small history index and
+# not every bookmark title. Each is pickled, to LOCAL_INDEX_CACHE and
+# LOCAL_HISTORY_CACHE, and rebuilt only when its own source file changes.
+#
+# Bookmarks and quickmarks are read through the index shared with bookmarks.py
+# and quickmarks.py (localindex.py). local_hits() asks it for the links whose
+# title, URL or keyword starts with the query, so they can be listed in the
+# search bar. Renders only query it: a render that finds a file changed since
+# it was indexed starts refresh_local_index() in a --_bg-refresh child (a
+# thread in the daemon), which re-parses it and re-mines the bookmark phrases,
+# and keeps serving the previous rows until that lands.
+LOCAL_INDEX_CACHE = os.path.expanduser("~/.cache/rofi-websearch/phrases.pickle")
+LOCAL_HISTORY_CACHE = os.path.expanduser(
+    "~/.cache/rofi-websearch/history-phrases.pickle"
+)
+_LOCAL_INDEX_VERSION = 3
+LOCAL_NGRAM_MAX = 4  # longest word n-gram mined out of a phrase
+LOCAL_NGRAM_MIN_COUNT = 2  # n-grams seen in fewer phrases than this are dropped
+LOCAL_SCAN_LIMIT = 400  # prefix matches examined per lookup
+_LOCAL_WEIGHTS = {"history": 3.0, "bookmark": 1.0}
+
+
+class PhraseIndex:
+    """Sorted prefix keys over scored phrases; lookups are a bisect and a scan."""
+
+    def __init__(self, scores: dict[str, float]) -> None:
+        self.phrases = sorted(scores, key=lambda p: (-scores[p], p))
+        self.scores = array.array("d", [scores[p] for p in self.phrases])
+        pairs = []
+        for pid, phrase in enumerate(self.phrases):
+            low = phrase.lower()
+            keys = {low} | {low[i + 1 :] for i, ch in enumerate(low) if ch == " "}
+            if looks_like_url(phrase):
+                keys.add(_strip_scheme(low))
+            pairs.extend((key, pid) for key in keys if key)
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = array.array("I", [pid for _, pid in pairs])
+
+    def state(self) -> tuple:
+        """Plain-data form for pickling (independent of this module's name)."""
+        return self.phrases, self.scores, self.keys, self.ids
+
+    @classmethod
+    def from_state(cls, state: tuple) -> "PhraseIndex":
+        index = cls.__new__(cls)
+        index.phrases, index.scores, index.keys, index.ids = state
+        return index
+
+    def complete(self, query: str, limit: int = MAX_COMPLETIONS) -> list[str]:
+        """
+        Best phrases with a key starting with query: phrases that start with it
+        first, then mid-phrase word matches, each in score order.
+        """
+        return [phrase for _, _, phrase in self.matches(query, limit)]
+
+    def matches(
+        self, query: str, limit: int = MAX_COMPLETIONS
+    ) -> list[tuple[int, float, str]]:
+        """(tier, -score, phrase) of the best matches, sortable across indexes."""
+        q = " ".join(query.lower().split())
+        if not q:
+            return []
+        best: dict[int, int] = {}
+        lo = bisect.bisect_left(self.keys, q)
+        for i in range(lo, min(lo + LOCAL_SCAN_LIMIT, len(self.keys))):
+            key = self.keys[i]
+            if not key.startswith(q):
+                break
+            pid = self.ids[i]
+            low = self.phrases[pid].lower()
+            if low == q:
+                continue
+            tier = 0 if low.startswith(q) else 1
+            best[pid] = min(tier, best.get(pid, tier))
+        ranked = sorted(best, key=lambda pid: (best[pid], pid))
+        return [
+            (best[pid], -self.scores[pid], self.phrases[pid]) for pid in ranked[:limit]
+        ]
+
+
+def _strip_scheme(url: str) -> str:
+    url = url.split("://", 1)[-1]
+    return url[4:] if url.startswith("www.") else url
+
+
+def _mine_phrases(texts, source: str) -> dict[str, float]:
+    """phrase -> score for (text, boost) pairs and their common n-grams."""
+    scores: dict[str, float] = {}
+    ngrams: dict[str, set[str]] = {}
+    for text, boost in texts:
+        text = " ".join(text.split())
+        if len(text) < 3:
+            continue
+        scores[text] = scores.get(text, 0.0) + _LOCAL_WEIGHTS[source] * boost
+        if looks_like_url(text):
+            continue
+        words = text.split(" ")
+        for n in range(2, min(LOCAL_NGRAM_MAX, len(words) - 1) + 1):
+            for i in range(len(words) - n + 1):
+                ngrams.setdefault(" ".join(words[i : i + n]), set()).add(text)
+    for gram, sources in ngrams.items():
+        if len(sources) >= LOCAL_NGRAM_MIN_COUNT:
+            scores[gram] = scores.get(gram, 0.0) + len(sources)
+    return scores
+
+
+def _bookmark_rows(path: str) -> list[tuple]:
+    from bookmarks import index_rows
+
+    return index_rows(path)
+
+
+def _quickmark_rows(path: str) -> list[tuple]:
+    from quickmarks import index_rows
+
+    return index_rows(path)
+
+
+_SHARED_INDEX = None  # localindex.LocalIndex, kept by the daemon between renders
+
+
+def _shared_index():
+    """
+    The shared bookmark/quickmark index as it stands. Renders only query it:
+    when a file changed since it was indexed, a background refresh catches up.
+    """
+    import sqlite3
+
+    global _SHARED_INDEX  # pylint: disable=global-statement
+    try:
+        if _SHARED_INDEX is None:
+            from localindex import LocalIndex
+
+            _SHARED_INDEX = LocalIndex()
+        if _SHARED_INDEX.stale([BOOKMARKS_FILE, QUICKMARKS_FILE]):
+            _schedule_index_refresh()
+    except (sqlite3.Error, OSError) as e:
+        _log("local: shared index unavailable: %s", e, level=WARNING)
+        return None
+    return _SHARED_INDEX
+
+
+# cache file -> (source signature, index), kept by the daemon between renders
+_PHRASE_MEMO: dict[str, tuple[tuple, PhraseIndex]] = {}
+
+
+def _load_phrases(cache: str, sig: tuple, mine) -> "PhraseIndex | None":
+    """
+    The index pickled at cache if it was built from sig, else mine()'s. With
+    mine None, whatever index is at hand (or None) is returned as it is.
+    """
+    import pickle
+    import threading
+
+    memo = _PHRASE_MEMO.get(cache)
+    if memo is not None and (memo[0] == sig or mine is None):
+        return memo[1]
+    try:
+        with open(cache, "rb") as f:
+            cached_sig, state = pickle.load(f)
+        if cached_sig == sig or mine is None:
+            _PHRASE_MEMO[cache] = (cached_sig, PhraseIndex.from_state(state))
+            return _PHRASE_MEMO[cache][1]
+    except (OSError, pickle.PickleError, EOFError, ValueError, TypeError):
+        pass
+    if mine is None:
+        return None
+    index = PhraseIndex(mine())
+    _log("local: indexed %d phrases into %s", len(index.phrases), cache, level=INFO)
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        tmp = f"{cache}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((sig, index.state()), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError as e:
+        _log("local: cannot write %s: %s", cache, e, level=WARNING)
+    _PHRASE_MEMO[cache] = (sig, index)
+    return index
+
+
+def load_bookmark_phrases(index=None) -> "PhraseIndex | None":
+    """
+    Bookmark phrases as of the shared index. Only a refresh, which passes the
+    index it just caught up, mines them; a render takes the last ones built.
+    """
+    import sqlite3
+
+    shared = index or _shared_index()
+    if shared is None:
+        return None
+    try:
+        version = shared.version(BOOKMARKS_FILE)
+        sig = (_LOCAL_INDEX_VERSION, BOOKMARKS_FILE, version)
+        if index is None:
+            phrases = _load_phrases(LOCAL_INDEX_CACHE, sig, None)
+            if _PHRASE_MEMO.get(LOCAL_INDEX_CACHE, (None,))[0] != sig:
+                _schedule_index_refresh()
+            return phrases
+        rows = index.items(BOOKMARKS_FILE)
+    except sqlite3.Error as e:
+        _log("local: cannot read bookmarks: %s", e, level=WARNING)
+        return None
+    titles = [(title or url, 1.0) for _, _, title, url, _ in rows if url]
+    return _load_phrases(
+        LOCAL_INDEX_CACHE, sig, lambda: _mine_phrases(titles, "bookmark")
+    )
+
+
+def refresh_local_index() -> None:
+    """Catch the shared index and the bookmark phrases up with their files."""
+    import sqlite3
+
+    from localindex import LocalIndex
+
+    try:
+        # Its own connection: the daemon keeps answering renders meanwhile
+        index = LocalIndex()
+        try:
+            with _phase("local_refresh.index"):
+                index.refresh("bookmark", BOOKMARKS_FILE, _bookmark_rows)
+                index.refresh("quickmark", QUICKMARKS_FILE, _quickmark_rows)
+            with _phase("local_refresh.phrases"):
+                load_bookmark_phrases(index)
+        finally:
+            index.close()
+    except (sqlite3.Error, OSError) as e:
+        _log("local: refresh failed: %s", e, level=WARNING)
+
+
+def load_history_phrases(hfile: str) -> PhraseIndex:
+    """Phrases of the history at hfile, rebuilt only when it changes."""
+
+    def mine() -> dict[str, float]:
+        history = load_history(hfile)
+        n = len(history)
+        return _mine_phrases(
+            [(e, 2.0 - rank / n) for rank, (e, _) in enumerate(history)], "history"
+        )
+
+    sig = (_LOCAL_INDEX_VERSION, hfile, _file_sig(hfile))
+    return _load_phrases(LOCAL_HISTORY_CACHE, sig, mine)
+
+
+def local_completions(query: str, hfile: str = DEFAULT_HISTORY_FILE) -> list[str]:
+    """Offline suggestions for query from the history and bookmark phrases."""
+    if not LOCAL_COMPLETIONS or len(query.strip()) < 2:
+        return []
+    matches = load_history_phrases(hfile).matches(query)
+    bookmarks = load_bookmark_phrases()
+    if bookmarks is not None:
+        matches += bookmarks.matches(query)
+    items: list[str] = []
+    for _, _, phrase in sorted(matches):
+        if phrase not in items:
+            items.append(phrase)
+    items = items[:MAX_COMPLETIONS]
+    _log("completions: local %s for %r", items, query)
+    return items
+
+
+def local_hits(query: str) -> list[tuple[str, str, str, str]]:
+    """(kind, title, url, keyword) of bookmarks and quickmarks matching query."""
+    import sqlite3
+
+    if not LOCAL_COMPLETIONS or len(query.strip()) < 2:
+        return []
+    shared = _shared_index()
+    try:
+        hits = shared.search(query, LOCAL_HITS) if shared else []
+    except sqlite3.Error as e:
+        _log("local: search error %s", e, level=WARNING)
+        return []
+    _log("local: %d hits for %r", len(hits), query)
+    return hits
+
+
+# ── Completion client ─────────────────────────────────────────────────────────
+# Suggestion providers are queried concurrently by a small asyncio HTTP/1.1
+# client running on its own event-loop thread. Connections are kept alive and
+# reused across fetches (for the life of the process, i.e. across keystrokes in
+# the daemon). Whatever has arrived by the deadline is merged and returned.
+class AsyncCompletionClient:
+    """Concurrent, keep-alive suggestion fetcher over asyncio streams."""
+
+    def __init__(self, providers: "dict[str, str] | None" = None) -> None:
+        import asyncio
+        import threading
+
+        self.providers = dict(providers or COMPLETION_PROVIDERS)
+        # (scheme, host, port) -> idle (reader, writer) pairs
+        self._idle: dict[tuple[str, str, int], list] = {}
+        self._ssl = None
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+
+    def fetch(
+        self,
+        query: str,
+        sources: "list[str] | None" = None,
+        deadline: float = COMPLETION_TIMEOUT,
+    ) -> list[str]:
+        """Merged suggestions for query from every source answering in time."""
+        import asyncio
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._gather(query, sources or list(self.providers), deadline), self._loop
+        )
+        return future.result(deadline + 1.0)
+
+    async def _gather(self, query: str, sources: list[str], deadline: float):
+        import asyncio
+
+        tasks = [asyncio.ensure_future(self._provider(n, query)) for n in sources]
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        lists: list[list[str]] = []
+        for name, task in zip(sources, tasks):
+            if task not in done:
+                msg = "completions: %s missed the %ss deadline"
+                _log(msg, name, deadline, level=INFO)
+            elif task.exception() is not None:
+                e = task.exception()
+                _log(
+                    "completions: %s error %s: %s",
+                    name,
+                    type(e).__name__,
+                    e,
+                    level=WARNING,
+                )
+            else:
+                lists.append(task.result())
+        if not lists and sources:
+            # Not an empty answer: keep whatever the cache already has
+            raise OSError(f"no completion source answered for {query!r}")
+        return _merge_suggestions(lists, query)
+
+    async def _provider(self, name: str, query: str) -> list[str]:
+        import json
+        import urllib.parse
+
+        url = self.providers[name].format(urllib.parse.quote_plus(query))
+        data = json.loads((await self.get(url)).decode("utf-8"))
+        if isinstance(data, list) and len(data) > 1 and isinstance(data[1], list):
+            return [str(s) for s in data[1]]
+        return []
+
+    async def get(self, url: str) -> bytes:
+        """GET url, reusing an idle connection to its host when there is one."""
+        import asyncio
+        import urllib.parse
+
+        parts = urllib.parse.urlsplit(url)
+        secure = parts.scheme == "https"
+        host = parts.hostname or ""
+        port = parts.port or (443 if secure else 80)
+        key = (parts.scheme, host, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        request = (
+            f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            "User-Agent: Mozilla/5.0\r\nAccept-Encoding: identity\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("ascii")
+        for attempt in (0, 1):
+            idle = self._idle.setdefault(key, [])
+            reused = bool(idle)
+            if reused:
+                reader, writer = idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(
+                    host, port, ssl=self._ssl_context() if secure else None
+                )
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, keep_alive, body = await _read_http_response(reader)
+            except asyncio.CancelledError:
+                writer.close()
+                raise
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                writer.close()
+                if reused and not attempt:
+                    continue  # the server dropped an idle keep-alive connection
+                raise
+            if keep_alive:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            if status != 200:
+                raise OSError(f"HTTP {status} from {host}")
+            return body
+        raise OSError(f"unreachable: {url}")
+
+    def _ssl_context(self):
+        if self._ssl is None:
+            import ssl  # only needed for https providers
+
+            self._ssl = ssl.create_default_context()
+        return self._ssl
+
+
+async def _read_http_response(reader) -> tuple[int, bool, bytes]:
+    """(status, connection reusable, body) of one HTTP/1.1 response."""
+    status_line = await reader.readline()
+    parts = status_line.split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+        raise ValueError(f"bad status line {status_line!r}")
+    status = int(parts[1])
+    headers: dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    keep_alive = headers.get("connection", "").lower() != "close"
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        return status, keep_alive, b"".join(chunks)
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        return status, keep_alive, await reader.readexactly(length)
+    return status, False, await reader.read()
+
+
+def _merge_suggestions(lists: list[list[str]], query: str) -> list[str]:
+    """Interleave provider lists in priority order, dropping duplicates."""
+    seen = {query.lower().strip()}
+    merged = []
+    for rank in range(max((len(s) for s in lists), default=0)):
+        for suggestions in lists:
+            if rank < len(suggestions) and suggestions[rank].lower() not in seen:
+                seen.add(suggestions[rank].lower())
+                merged.append(suggestions[rank])
+    return merged[:MAX_COMPLETIONS]
+
+
+_CLIENT: "AsyncCompletionClient | None" = None
+
+
+def _completion_client() -> AsyncCompletionClient:
+    global _CLIENT  # pylint: disable=global-statement
+    if _CLIENT is None:
+        _CLIENT = AsyncCompletionClient()
+    return _CLIENT
+
+
+def _bg_fetch(query: str, engine: str, owns_lock: bool = True) -> None:
+    """Fetch and cache completions for query.
+
+    owns_lock is False for a synchronous fetch that never took the in-flight
+    lock, so it must not release (or mark failed) a lock some other fetch holds.
+    """
+    import concurrent.futures
+
+    _log("bg_fetch: started query=%r engine=%r", query, engine)
+    key = _cache_key(query, engine)
+    failed = False
+    try:
+        cancel = _CANCEL_EVENTS.get(key)
+        if cancel is not None and cancel.is_set():
+            _log("bg_fetch: dropped superseded query=%r", query)
+            return
+        with _phase("bg_fetch.fetch"):
+            results = _completion_client().fetch(query, COMPLETION_SOURCES)
+        with _phase("bg_fetch.cache_write"):
+            _write_cache(key, results)
+        _log("completions: cached %s for %r", results, query)
+    except (concurrent.futures.TimeoutError, OSError) as e:
+        failed = True
+        _log(
+            "completions: bg fetch error %s: %s", type(e).__name__, e, level=WARNING
+        )
+    finally:
+        if owns_lock:
+            _release_fetch(key, failed)
+
+
+# ── In-flight fetch registry ──────────────────────────────────────────────────
+# One lock file per cache key: {"owner": "<pid>" or "<pid>:<tid>", "query", "engine"}.
+# A second render for the same key coalesces onto the running fetch, and
+# fetches for prefixes the user has typed past are cancelled. A fetch that
+# fails leaves its lock behind as {"failed": true, ...}, which holds off new
+# fetches for that key for COMPLETION_RETRY seconds. The directory is only used
+# once _private_dir() has checked it belongs to this user, and a fetch child is
+# only signalled while its pid still has the start time recorded in the lock.
+INFLIGHT_DIR = (
+    os.path.join(os.environ["XDG_RUNTIME_DIR"], "search-inflight")
+    if os.environ.get("XDG_RUNTIME_DIR")
+    else f"/tmp/search-inflight-{os.getuid()}"
+)
+# Fetch counters: one appended line per event, folded into the totals file
+# under an flock past METRICS_FOLD_BYTES, as the metrics journal is
+INFLIGHT_STATS = os.path.join(INFLIGHT_DIR, "stats.json")
+INFLIGHT_COUNTS = os.path.join(INFLIGHT_DIR, "stats.log")
+# Held by the one refresh_local_index() run at a time; the dot keeps it out of
+# the fetch locks _cancel_superseded() walks
+INFLIGHT_REFRESH = os.path.join(INFLIGHT_DIR, "refresh.json")
+REFRESH_TIMEOUT = 120  # seconds before a refresh lock is presumed abandoned
+
+_FETCH_COUNTERS = (
+    "fresh",
+    "stale",
+    "miss",
+    "spawned",
+    "coalesced",
+    "cancelled",
+    "backoff",
+)
+
+# key -> cancel flag for fetches running as threads inside the daemon
+_CANCEL_EVENTS: dict[str, threading.Event] = {}
+
+
+def _inflight_path(key: str) -> str:
+    import hashlib
+
+    return os.path.join(INFLIGHT_DIR, hashlib.sha1(key.encode()).hexdigest()[:20])
+
+
+def _owner_token() -> str:
+    import threading
+
+    if _DAEMON:
+        return f"{os.getpid()}:{threading.get_ident()}"
+    return str(os.getpid())
+
+
+def _read_lock(path: str) -> dict:
+    import json
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _proc_start(pid: int) -> "str | None":
+    """pid's start time in clock ticks since boot (Linux), None if unknown."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rpartition(b")")[2].split()
+        return fields[19].decode()
+    except (OSError, IndexError):
+        return None
+
+
+def _lock_age(path: str) -> float:
+    try:
+        return time.time() - os.stat(path).st_mtime
+    except OSError:
+        return math.inf
+
+
+def _owner_alive(lock: dict, path: str) -> bool:
+    """A lock is live while its owner exists and it is younger than any fetch."""
+    if _lock_age(path) > COMPLETION_TIMEOUT * 4:
+        return False
+    owner = str(lock.get("owner", ""))
+    if not owner:
+        return True  # spawner has not written the child's pid yet
+    try:
+        os.kill(int(owner.split(":")[0]), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _fetch_stat(counter: str, key: str) -> None:
+    """Count one fetch event with a single appended line; log the running totals."""
+    if not _METRICS and _LOG_LEVEL > DEBUG:
+        return  # a write per keystroke is only worth it when asked for
+    try:
+        _private_dir(INFLIGHT_DIR)
+        fd = os.open(INFLIGHT_COUNTS, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            os.write(fd, f"{counter}\n".encode())
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > METRICS_FOLD_BYTES:
+            fold_fetch_stats()
+    except OSError:
+        return
+    if _LOG_LEVEL <= DEBUG:
+        stats = _read_lock(INFLIGHT_STATS)
+        try:
+            with open(INFLIGHT_COUNTS, "r", encoding="utf-8") as f:
+                for line in f:
+                    name = line.strip()
+                    stats[name] = int(stats.get(name, 0)) + 1
+        except OSError:
+            pass
+        totals = " ".join(f"{k}={stats.get(k, 0)}" for k in _FETCH_COUNTERS)
+        _log("fetch: %s key=%r [%s]", counter, key, totals)
+
+
+def fold_fetch_stats() -> dict:
+    """Merge the INFLIGHT_COUNTS events into the INFLIGHT_STATS totals."""
+    import fcntl
+    import json
+
+    with open(f"{INFLIGHT_STATS}.lock", "w", encoding="utf-8") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stats = _read_lock(INFLIGHT_STATS)
+        taken = f"{INFLIGHT_COUNTS}.{os.getpid()}"
+        try:
+            os.replace(INFLIGHT_COUNTS, taken)
+        except FileNotFoundError:
+            return stats
+        with open(taken, "r", encoding="utf-8") as f:
+            for line in f:
+                name = line.strip()
+                stats[name] = int(stats.get(name, 0)) + 1
+        tmp = f"{INFLIGHT_STATS}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp, INFLIGHT_STATS)
+        os.unlink(taken)
+    return stats
+
+
+def _cancel_superseded(query: str, engine: str) -> None:
+    """Cancel in-flight fetches whose query is a strict prefix of the new one."""
+    import contextlib
+    import signal
+
+    try:
+        names = os.listdir(_private_dir(INFLIGHT_DIR))
+    except OSError:
+        return
+    q = query.lower().strip()
+    for name in names:
+        if not name.isalnum():  # lock names are hex digests
+            continue
+        path = os.path.join(INFLIGHT_DIR, name)
+        lock = _read_lock(path)
+        if lock.get("failed"):
+            if _lock_age(path) >= COMPLETION_RETRY:  # sweep expired markers
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+            continue
+        other = str(lock.get("query", "")).lower().strip()
+        if lock.get("engine") != engine or not other or other == q:
+            continue
+        if not q.startswith(other):
+            continue
+        if not _owner_alive(lock, path):
+            # Left behind by a fetch that died: its pid may belong to an
+            # unrelated process by now, so only the lock is removed
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            continue
+        owner = str(lock.get("owner", ""))
+        pid, _, tid = owner.partition(":")
+        if tid:
+            event = _CANCEL_EVENTS.get(_cache_key(other, engine))
+            if event is not None:
+                event.set()
+        elif (
+            pid.isdigit()
+            and int(pid) != os.getpid()
+            and lock.get("started")
+            and _proc_start(int(pid)) == lock["started"]
+        ):
+            try:
+                os.kill(int(pid), signal.SIGTERM)
+            except OSError:
+                pass
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        _fetch_stat("cancelled", _cache_key(other, engine))
+
+
+def _release_fetch(key: str, failed: bool = False) -> None:
+    """
+    Drop key's lock file if this process/thread owns it; after a failed fetch
+    it is replaced by a backoff marker instead.
+    """
+    import json
+
+    path = _inflight_path(key)
+    lock = _read_lock(path)
+    if str(lock.get("owner", "")) in (_owner_token(), ""):
+        try:
+            if failed:
+                tmp = f"{path}.{os.getpid()}.tmp"
+                marker = {"failed": True, "query": lock.get("query", "")}
+                marker["engine"] = lock.get("engine", "")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(marker, f)
+                os.replace(tmp, path)
+            else:
+                os.unlink(path)
+        except OSError:
+            pass
+    _CANCEL_EVENTS.pop(key, None)
+
+
+def _schedule_fetch(query: str, engine: str) -> None:
+    """Start a background fetch for query unless one for the same key is running."""
+    import contextlib
+    import json
+    import subprocess
+    import threading
+
+    key = _cache_key(query, engine)
+    try:
+        _private_dir(INFLIGHT_DIR)
+    except OSError as e:
+        _log("fetch: registry unavailable %s", e, level=WARNING)
+        return
+    _cancel_superseded(query, engine)
+    path = _inflight_path(key)
+    for _ in (0, 1):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            break
+        except FileExistsError:
+            lock = _read_lock(path)
+            if lock.get("failed") and _lock_age(path) < COMPLETION_RETRY:
+                _fetch_stat("backoff", key)
+                return
+            if not lock.get("failed") and _owner_alive(lock, path):
+                _fetch_stat("coalesced", key)
+                return
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        except OSError as e:
+            _log("fetch: registry error %s", e, level=WARNING)
+            return
+    else:
+        return
+
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        lock = {"query": query, "engine": engine}
+        if _DAEMON:
+            _CANCEL_EVENTS[key] = threading.Event()
+            thread = threading.Thread(
+                target=_bg_fetch, args=(query, engine), daemon=True
+            )
+            thread.start()
+            lock["owner"] = f"{os.getpid()}:{thread.ident}"
+        else:
+            try:
+                proc = subprocess.Popen(  # pylint: disable=consider-using-with
+                    [sys.executable, sys.argv[0], "--_bg-fetch", query, engine],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            except OSError as e:
+                _log("fetch: cannot start %s", e, level=WARNING)
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+                return
+            lock["owner"] = str(proc.pid)
+            lock["started"] = _proc_start(proc.pid)
+        json.dump(lock, f)
+    _fetch_stat("spawned", key)
+
+
+def _schedule_index_refresh() -> None:
+    """Start refresh_local_index() in the background unless it is running."""
+    import contextlib
+    import subprocess
+    import threading
+
+    for _ in (0, 1):
+        try:
+            _private_dir(INFLIGHT_DIR)
+            os.close(os.open(INFLIGHT_REFRESH, os.O_CREAT | os.O_EXCL, 0o600))
+            break
+        except FileExistsError:
+            if _lock_age(INFLIGHT_REFRESH) < REFRESH_TIMEOUT:
+                return
+            with contextlib.suppress(OSError):
+                os.unlink(INFLIGHT_REFRESH)
+        except OSError as e:
+            _log("local: refresh lock error %s", e, level=WARNING)
+            return
+    else:
+        return
+    if _DAEMON:
+        threading.Thread(target=_bg_refresh, daemon=True).start()
+    else:
+        try:
+            subprocess.Popen(  # pylint: disable=consider-using-with
+                [sys.executable, sys.argv[0], "--_bg-refresh"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            _log("local: cannot start refresh %s", e, level=WARNING)
+            with contextlib.suppress(OSError):
+                os.unlink(INFLIGHT_REFRESH)
+            return
+    _log("local: scheduled a shared index refresh", level=INFO)
+
+
+def _bg_refresh() -> None:
+    import contextlib
+
+    try:
+        refresh_local_index()
+    finally:
+        with contextlib.suppress(OSError):
+            os.unlink(INFLIGHT_REFRESH)
+
+
+def fetch_completions(
+    query: str, engine: str, hfile: str = DEFAULT_HISTORY_FILE
+) -> list[str]:
+    """
+    Return cached completions instantly (stale-while-revalidate).
+
+    Fresh lists are served as they are. Stale ones are served while a single
+    background fetch refreshes them. On a miss (never fetched, or expired and
+    dropped by the cache) the nearest cached ancestor/descendant query supplies
+    approximate suggestions until the background fetch lands. Local phrase
+    suggestions are interleaved with whatever the network side has, so
+    completions keep working offline.
+    """
+    if not query or len(query) < 3:
+        return []
+    key = _cache_key(query, engine)
+    with _phase("script_mode.cache_read"):
+        cached, fetched_at = _read_cache(key)
+    if not fetched_at:
+        state = "miss"
+    elif time.time() - fetched_at < COMPLETION_FRESH:
+        state = "fresh"
+    else:
+        state = "stale"
+    _log("completions: %s for %r -> %s", state, query, cached)
+    _fetch_stat(state, key)
+    if state != "fresh":
+        _schedule_fetch(query, engine)
+    if state == "miss":
+        with _phase("script_mode.cache_read"):
+            cached = _derived_completions(query, engine)
+    with _phase("script_mode.local"):
+        local = local_completions(query, hfile)
+    return _merge_suggestions([cached, local], query)
+
+
+# ── Completion daemon ─────────────────────────────────────────────────────────
+# True inside the --daemon process: fetches run on threads, state stays in memory
+_DAEMON = False
+
+# Environment forwarded from a script-mode client to the daemon. The named
+# variables are the ones a browser opened by the daemon needs to land in the
+# client's session rather than wherever the daemon was started from.
+_DAEMON_ENV_PREFIXES = ("ROFI_", "WEBSEARCH_")
+_DAEMON_ENV_NAMES = (
+    "DISPLAY",
+    "WAYLAND_DISPLAY",
+    "XDG_RUNTIME_DIR",
+    "DBUS_SESSION_BUS_ADDRESS",
+)
+
+
+def _forwarded_env() -> dict[str, str]:
+    return {
+        k: v
+        for k, v in os.environ.items()
+        if k.startswith(_DAEMON_ENV_PREFIXES) or k in _DAEMON_ENV_NAMES
+    }
+
+
+def _daemon_request(argv: list[str], env: dict[str, str]) -> "bytes | None":
+    """
+    Render one script-mode call through the daemon; None when the caller
+    should render it itself. That is only when no daemon of this user could be
+    reached, or for a plain keystroke (ROFI_RETV=0): once a selection has been
+    sent, the daemon may still act on it, so it is never run a second time.
+    """
+    try:
+        st = os.lstat(DAEMON_SOCKET)
+    except OSError:
+        return None
+    if st.st_uid != os.getuid():
+        _log("daemon: %s belongs to uid %d", DAEMON_SOCKET, st.st_uid, level=WARNING)
+        return None
+    # marshal is built into the interpreter, so the client side never pays for
+    # importing json (and re) on a keystroke the daemon ends up answering
+    import marshal
+    import socket
+
+    replayable = env.get("ROFI_RETV", "0") == "0"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(DAEMON_TIMEOUT)
+        try:
+            sock.connect(DAEMON_SOCKET)
+        except OSError as e:
+            _log("daemon: not reachable %s: %s", type(e).__name__, e)
+            return None
+        try:
+            sock.sendall(marshal.dumps((argv, env)))
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while chunk := sock.recv(65536):
+                chunks.append(chunk)
+        except OSError as e:
+            _log(
+                "daemon: request failed %s: %s", type(e).__name__, e, level=WARNING
+            )
+            return None if replayable else b""
+    status, _, body = b"".join(chunks).partition(b"\n")
+    if status == b"ok":
+        return body
+    return None if replayable else b""
+
+
+def _daemon_render(argv: list[str], env: dict[str, str], args) -> bytes:
+    """Run script_mode for one client request and return what it printed."""
+    import contextlib
+    import io
+
+    saved_argv = sys.argv
+    saved_env = _forwarded_env()
+    raw = io.BytesIO()
+    out = io.TextIOWrapper(raw, encoding="utf-8", newline="\n")
+    try:
+        for k in saved_env:
+            del os.environ[k]
+        os.environ.update(env)
+        sys.argv = argv
+        with contextlib.redirect_stdout(out):
+            script_mode(args)
+    finally:
+        sys.argv = saved_argv
+        for k in env:
+            os.environ.pop(k, None)
+        os.environ.update(saved_env)
+        _flush_log()
+    out.flush()
+    return raw.getvalue()
+
+
+def run_daemon(args: argparse.Namespace) -> None:
+    """Serve script-mode renders on DAEMON_SOCKET until interrupted."""
+    global _DAEMON  # pylint: disable=global-statement
+    import marshal
+    import signal
+    import socket
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        """One connection = one script-mode invocation, rendered in-process."""
+
+        # Applied to the connection by setup(): the server handles one client
+        # at a time, so one that never finishes its request must not wedge it
+        timeout = DAEMON_TIMEOUT
+
+        def handle(self) -> None:
+            try:
+                data = self.rfile.read()
+            except OSError as e:
+                _log("daemon: request not read %s", e, level=WARNING)
+                return
+            if not data:  # liveness probe
+                return
+            try:
+                argv, env = marshal.loads(data)
+                argv = [str(a) for a in argv]
+                env = {str(k): str(v) for k, v in dict(env).items()}
+            except (ValueError, EOFError, TypeError) as e:
+                _log("daemon: bad request %s", e, level=WARNING)
+                self.wfile.write(b"error\n")
+                return
+            try:
+                body = _daemon_render(argv, env, args)
+            except Exception as e:  # pylint: disable=broad-except
+                _log(
+                    "daemon: render failed %s: %s",
+                    type(e).__name__,
+                    e,
+                    level=ERROR,
+                )
+                self.wfile.write(b"error\n")
+                return
+            try:
+                self.wfile.write(b"ok\n" + body)
+            except OSError as e:
+                _log("daemon: reply not sent %s", e, level=WARNING)
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.connect(DAEMON_SOCKET)
+        print(f"daemon already running on {DAEMON_SOCKET}", file=sys.stderr)
+        sys.exit(1)
+    except OSError:
+        pass
+    try:
+        os.unlink(DAEMON_SOCKET)
+    except FileNotFoundError:
+        pass
+    _DAEMON = True
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(DAEMON_SOCKET, Handler)
+    finally:
+        os.umask(old_umask)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    _log("daemon: listening on %s", DAEMON_SOCKET, level=INFO)
+    _flush_log()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(DAEMON_SOCKET)
+        except OSError:
+            pass
+        _log("daemon: stopped", level=INFO)
+
+
+# ── Open URL ──────────────────────────────────────────────────────────────────
+def open_url(url: str, browser: str) -> None:
+    import subprocess
+
+    subprocess.Popen(  # pylint: disable=consider-using-with
+        [browser, url], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+# ── Rofi helpers ──────────────────────────────────────────────────────────────
+def _write_raw(data) -> None:
+    """Write pre-encoded rows to stdout after whatever print() has buffered."""
+    sys.stdout.flush()
+    sys.stdout.buffer.write(data)
+
+
+def print_option(text: str, meta: str = "") -> None:
+    if meta:
+        print(f"{text}\0meta\x1f{meta}")
+    else:
+        print(text)
+
+
+def set_prompt(prompt: str) -> None:
+    sys.stdout.write(f"{ROFI_PROMPT}{prompt}\n")
+
+
+def set_message(msg: str) -> None:
+    sys.stdout.write(f"{ROFI_MESSAGE}{msg}\n")
+
+
+# ── Modes ─────────────────────────────────────────────────────────────────────
+def _render_filtered(
+    query: str, history: "HistorySnapshot | list[tuple[str, str]]"
+) -> None:
+    """Emit the top FILTER_TOP_N history matches, tagged so rofi keeps them."""
+    tag = query.strip()
+    if isinstance(history, HistorySnapshot):
+        history.write_matches(query, FILTER_TOP_N)
+        return
+    for e, ts in filter_history(history, query, FILTER_TOP_N + 1):
+        if e != query:
+            print_option(e, meta=f"{ts} {tag}".strip())
+
+
+def mode_search(
+    query: str,
+    history: "HistorySnapshot | list[tuple[str, str]]",
+    engine: str,
+    filter_mode: str = "rofi",
+    hfile: str = "",
+) -> None:
+    """Render the main search interface, with bang-aware prompt/completions."""
+    with _phase("script_mode.render"):
+        _mode_search(query, history, engine, filter_mode, hfile)
+
+
+def _mode_search(
+    query: str,
+    history: "HistorySnapshot | list[tuple[str, str]]",
+    engine: str,
+    filter_mode: str,
+    hfile: str,
+) -> None:
+    bang, rest = parse_bang(query)
+
+    # ── Bang mode: user has typed a valid "!bang [query]" ─────────────────────
+    if bang:
+        label, _ = _bangs().bangs[bang]
+        set_prompt(f" {label}:")
+        set_message(
+            f"<b>{bang}</b> → {label}  "
+            f"•  Enter to search  •  no query opens the site"
+        )
+        # Pin the full typed text to the top so Enter always does what you see
+        print_option(query)
+        # Sub-query completions (re-use the normal engine's suggestion API)
+        if rest and len(rest) >= 3:
+            for c in fetch_completions(rest, engine, hfile):
+                full = f"{bang} {c}"
+                if full != query:
+                    print_option(full)
+        return
+
+    # ── Bang hint mode: user typed "!", "!!" or "!<partial>" with no match ──
+    if query.startswith("!"):
+        mode_bang_hints(query)
+        return
+
+    # ── Normal search / URL ───────────────────────────────────────────────────
+    set_prompt(f" Search / URL ({engine}):")
+    if query:
+        print_option(query)
+    completions = fetch_completions(query, engine, hfile) if query else []
+    for c in completions:
+        if c != query:
+            print_option(c)
+    with _phase("script_mode.local"):
+        hits = local_hits(query) if query else []
+    shown = {query, *completions}
+    for _, title, url, keyword in hits:
+        if url not in shown:
+            shown.add(url)
+            meta = title if keyword in (None, title) else f"{keyword} {title}"
+            print_option(url, meta=meta)
+    if filter_mode == "server":
+        _render_filtered(query, history)
+    elif isinstance(history, HistorySnapshot):
+        history.write_rows(skip=query)
+    else:
+        for e, ts in history:
+            if e != query:
+                print_option(e, meta=ts)
+    print_option(HISTORY_ENTRY)
+
+
+def mode_bang_hints(query: str) -> None:
+    set_prompt(" Bangs:")
+    set_message("Type !bang to search a specific site  •  select to open site root")
+    for display, _ in bang_hint_entries(query):
+        print_option(display)
+
+
+def mode_history(history: list[tuple[str, str]]) -> None:
+    with _phase("script_mode.render"):
+        set_prompt("  History — select to DELETE")
+        set_message("Type to filter • select entry to remove it")
+        print_option(CLEAR_ALL)
+        for e, ts in history:
+            row = f"{e}  <span size='small' color='gray'>[{ts}]</span>"
+            print_option(row, meta=e)
+
+
+def mode_confirm() -> None:
+    with _phase("script_mode.render"):
+        set_prompt(" Clear ALL history?")
+        sys.stdout.write(ROFI_NO_CUSTOM)
+        print_option(CONFIRM_YES)
+        print_option(CONFIRM_NO)
+
+
+# ── Rofi launch ───────────────────────────────────────────────────────────────
+def _rofi_cmd(script: str) -> list[str]:
+    return [
+        "rofi",
+        "-show",
+        "websearch",
+        "-modi",
+        f"websearch:{script}",
+        "-no-fixed-num-lines",
+        "-markup-rows",
+        "-sync",
+    ]
+
+
+def launch_rofi(args: argparse.Namespace) -> None:
+    import contextlib
+    import subprocess
+
+    session = f"{os.getpid()}-{os.urandom(4).hex()}"
+    state = _session_file(session)
+    env = os.environ.copy()
+    env.update(
+        {
+            "WEBSEARCH_ENGINE": str(args.engine),
+            "WEBSEARCH_BROWSER": str(args.browser),
+            "WEBSEARCH_HISTORY": str(args.history_file),
+            "WEBSEARCH_RANK": str(args.rank),
+            "WEBSEARCH_FILTER": str(args.filter),
+            "WEBSEARCH_SESSION": session,
+            "WEBSEARCH_ACTIVE": "1",
+        }
+    )
+    try:
+        while True:
+            with _phase("launch_rofi.rofi"):
+                subprocess.run(_rofi_cmd(sys.argv[0]), env=env, check=False)
+            # Closed from the history or confirm menu: back to a fresh search bar
+            if not state or _read_session_mode(state) == "search":
+                break
+            os.unlink(state)
+    finally:
+        if state:
+            with contextlib.suppress(OSError):
+                os.unlink(state)
+
+
+def script_mode(args: "argparse.Namespace | None" = None) -> None:
+    """Handle keystrokes and selections passed from Rofi."""
+    if not _DAEMON:
+        env = _forwarded_env()
+        out = _daemon_request(sys.argv, env)
+        if out is not None:
+            sys.stdout.buffer.write(out)
+            return
+
+    def setting(var: str, name: str, default: str) -> str:
+        return str(os.environ.get(var) or getattr(args, name, default))
+
+    query = sys.argv[1] if len(sys.argv) > 1 else ""
+    engine = setting("WEBSEARCH_ENGINE", "engine", DEFAULT_ENGINE)
+    browser = setting("WEBSEARCH_BROWSER", "browser", "xdg-open")
+    hfile = setting("WEBSEARCH_HISTORY", "history_file", DEFAULT_HISTORY_FILE)
+    rank = setting("WEBSEARCH_RANK", "rank", DEFAULT_RANK)
+    filter_mode = setting("WEBSEARCH_FILTER", "filter", DEFAULT_FILTER)
+    retv = int(os.environ.get("ROFI_RETV", "0"))
+
+    mode = get_mode()
+    sys.stdout.write(f"{ROFI_DATA}{mode}\n")  # keep it for the next keystroke
+    _log(
+        "script_mode: mode=%r query=%r retv=%d engine=%r", mode, query, retv, engine
+    )
+
+    # ── retv=0 in search mode: the per-keystroke render, served from snapshot ─
+    if (
+        mode not in ("confirm", "history")
+        and query != HISTORY_ENTRY
+        and not (query and retv in (1, 2))
+    ):
+        with _phase("script_mode.history"):
+            history_view = load_history_view(hfile, rank)
+        mode_search(query, history_view, engine, filter_mode, hfile)
+        return
+
+    # Only selections and the history/confirm menus get this far
+    import re
+    import urllib.parse
+
+    with _phase("script_mode.history"):
+        history = load_history(hfile)
+
+    # ── Confirm mode ──────────────────────────────────────────────────────────
+    if mode == "confirm":
+        if query == CONFIRM_YES:
+            clear_all_history(hfile)
+            set_mode("history")
+            mode_history([])
+        else:
+            set_mode("history")
+            mode_history(history)
+        return
+
+    # ── History mode ──────────────────────────────────────────────────────────
+    if mode == "history":
+        if query == CLEAR_ALL:
+            set_mode("confirm")
+            mode_confirm()
+            return
+        if query and query != HISTORY_ENTRY:
+            raw = re.sub(r"\s*<span[^>]*>.*?</span>", "", query).strip()
+            raw = re.sub(r"\s+\[[\d\- :]+\]$", "", raw).strip()
+            history = delete_entry(hfile, raw, history)
+        set_mode("history")
+        mode_history(history)
+        return
+
+    # ── Switch to history view ────────────────────────────────────────────────
+    if query == HISTORY_ENTRY:
+        set_mode("history")
+        mode_history(history)
+        return
+
+    # ── Shift+Enter (retv=2): open bang URL or fetch live suggestions ─────────
+    if query and retv == 2:
+        # !! or partial bang — print hints directly so rofi shows them
+        if query.startswith("!") and not parse_bang(query)[0]:
+            mode_bang_hints(query)
+            return
+        bang, rest = parse_bang(query)
+        if bang:
+            # Bang + Shift+Enter: open the bang URL (same as regular Enter)
+            history = save_history(hfile, query, history)
+            open_url(bang_url(bang, rest), browser)
+            return
+        # Normal Shift+Enter: fetch suggestions and re-render
+        _bg_fetch(query, engine, owns_lock=False)
+        set_mode("search")
+        ranked = rank_history(hfile, history, rank)
+        mode_search(query, ranked, engine, filter_mode, hfile)
+        return
+
+    # ── Enter (retv=1): open selected / typed item ────────────────────────────
+    if query and retv == 1:
+        # !! or unrecognised partial bang — print hints directly so rofi shows them
+        if query.startswith("!") and not parse_bang(query)[0] and "—" not in query:
+            mode_bang_hints(query)
+            return
+
+        # If the user selected a bang cheatsheet hint line ("!yt  —  YouTube"),
+        # open the site root (no query given).
+        bang_token = hint_bang(query)
+        if bang_token:
+            open_url(bang_url(bang_token, ""), browser)
+            return
+
+        # Resolve bang → URL
+        bang, rest = parse_bang(query)
+        if bang:
+            history = save_history(hfile, query, history)
+            open_url(bang_url(bang, rest), browser)
+            return
+
+        # Normal search / URL
+        history = save_history(hfile, query, history)
+        if looks_like_url(query):
+            url = normalise_url(query)
+        else:
+            url = SEARCH_ENGINES[engine].format(urllib.parse.quote_plus(query))
+        open_url(url, browser)
+        return
+
+    # ── retv=0: Rofi is rendering / updating the list ─────────────────────────
+    ranked = rank_history(hfile, history, rank)
+    mode_search(query, ranked, engine, filter_mode, hfile)
+
+
+# ── Entry point ───────────────────────────────────────────────────────────────
+# ── dmenu helpers ────────────────────────────────────────────────────────────
+
+
+def _dmenu(items: list[str], prompt: str) -> "str | None":
+    import subprocess
+
+    result = subprocess.run(
+        ["dmenu", "-l", "15", "-p", prompt],
+        input="\n".join(items),
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def _dm_notify(msg: str) -> None:
+    import subprocess
+
+    subprocess.run(["notify-send", "Search", msg], check=False)
+
+
+def _dm_mode_bangs(history, engine, browser, hfile):
+    bang_items = [display for display, _ in bang_hint_entries()]
+    choice = _dmenu(bang_items, "Select bang:")
+    if choice is None:
+        return
+    bang_token = hint_bang(choice)
+    if bang_token is None:
+        return
+    label, _ = _bangs().bangs[bang_token]
+    query = _dmenu([], f"{label} query:")
+    if query is None:
+        return
+    full = f"{bang_token} {query}".strip()
+    save_history(hfile, full, history)
+    open_url(bang_url(bang_token, query), browser)
+
+
+def _dm_mode_history(history, hfile):
+    if not history:
+        _dm_notify("History is empty.")
+        return
+    choice = _dmenu([e for e, _ in history], "Delete entry:")
+    if choice is None:
+        return
+    delete_entry(hfile, choice, history)
+    _dm_notify(f"Deleted: {choice}")
+
+
+def _dm_mode_confirm_clear(history, hfile):
+    choice = _dmenu(["No — cancel", "Yes — delete everything"], "Clear all history?")
+    if choice and "Yes" in choice:
+        clear_all_history(hfile)
+        _dm_notify("History cleared.")
+
+
+def _dm_fetch_and_pick(
+    query: str, engine: str, browser: str, hfile: str, history
+) -> None:
+    """Fetch completions for query, show second dmenu to pick or confirm, then open."""
+    import concurrent.futures
+    import urllib.parse
+
+    try:
+        with _phase("launch_dmenu.fetch"):
+            suggestions = _completion_client().fetch(query, COMPLETION_SOURCES, 3.0)
+    except (concurrent.futures.TimeoutError, OSError):
+        suggestions = []
+    with _phase("launch_dmenu.local"):
+        local = local_completions(query, hfile)
+    suggestions += [s for s in local if s not in suggestions]
+    with _phase("launch_dmenu.local"):
+        suggestions += [h[2] for h in local_hits(query) if h[2] not in suggestions]
+
+    # Build second menu: query itself at top, then suggestions, then history hits
+    items = [query] + suggestions[:8]
+    related = filter_history(history, query, 8)
+    items += [e for e, _ in related if e not in items]
+    choice = _dmenu(items, f"Confirm / pick ({engine}):")
+    if choice is None:
+        return
+
+    save_history(hfile, choice, history)
+
+    bang, rest = parse_bang(choice)
+    if bang:
+        open_url(bang_url(bang, rest), browser)
+        return
+    if looks_like_url(choice):
+        open_url(normalise_url(choice), browser)
+        return
+
+    url = SEARCH_ENGINES[engine].format(urllib.parse.quote_plus(choice))
+    open_url(url, browser)
+
+
+def launch_dmenu(args: argparse.Namespace) -> None:
+    with _phase("launch_dmenu.history"):
+        history = load_history(args.history_file)
+        ranked = rank_history(args.history_file, history, args.rank)
+    items = ["!! (show all bangs)", ":history", ":clear"] + [e for e, _ in ranked]
+
+    with _phase("launch_dmenu.dmenu"):
+        choice = _dmenu(items, f"Search ({args.engine}):")
+    if choice is None:
+        return
+
+    if choice == ":history":
+        _dm_mode_history(history, args.history_file)
+        return
+    if choice == ":clear":
+        _dm_mode_confirm_clear(history, args.history_file)
+        return
+    if choice == "!! (show all bangs)":
+        _dm_mode_bangs(history, args.engine, args.browser, args.history_file)
+        return
+
+    bang, rest = parse_bang(choice)
+    if bang:
+        save_history(args.history_file, choice, history)
+        open_url(bang_url(bang, rest), args.browser)
+        return
+
+    if looks_like_url(choice):
+        save_history(args.history_file, choice, history)
+        open_url(normalise_url(choice), args.browser)
+        return
+
+    # Not a bang or URL — fetch suggestions and show second dmenu
+    _dm_fetch_and_pick(choice, args.engine, args.browser, args.history_file, history)
+
+
+def main() -> None:
+    started = time.process_time()
+    if len(sys.argv) == 4 and sys.argv[1] == "--_bg-fetch":
+        _mark_startup("bg_fetch", started)
+        _bg_fetch(query=sys.argv[2], engine=sys.argv[3])
+        return
+    if sys.argv[1:] == ["--_bg-refresh"]:
+        _mark_startup("bg_refresh", started)
+        _bg_refresh()
+        return
+    if IS_WAYLAND and "WEBSEARCH_ACTIVE" in os.environ:
+        # Rofi script-mode: settings come from the environment launch_rofi set
+        _mark_startup("script_mode", started)
+        script_mode()
+        return
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--browser", default="xdg-open")
+    parser.add_argument(
+        "--engine", default=DEFAULT_ENGINE, choices=list(SEARCH_ENGINES.keys())
+    )
+    parser.add_argument("--history-file", default=DEFAULT_HISTORY_FILE)
+    parser.add_argument(
+        "--rank",
+        default=DEFAULT_RANK,
+        choices=list(RANKS),
+        help="order history by last use or by visit frequency and recency",
+    )
+    parser.add_argument(
+        "--filter",
+        default=DEFAULT_FILTER,
+        choices=list(FILTERS),
+        help="let rofi filter all history, or send only the top matches",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=list(LOG_LEVELS),
+        help=f"log records at or above this level to {LOG_FILE or 'nowhere'}",
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=list(LOG_FORMATS),
+        help="plain text lines, or JSON lines with per-run phase timings",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help=f"record per-phase timings into {METRICS_FILE}",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print p50/p95/p99 per phase from the recorded metrics",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help=f"serve completions and renders on {DAEMON_SOCKET}",
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="rebuild the history trigram index from scratch",
+    )
+    parser.add_argument(
+        "--check-index",
+        action="store_true",
+        help="verify the history trigram index against the history file",
+    )
+    args, _ = parser.parse_known_args()
+    # Exported so the rofi script-mode runs and background fetches log the same
+    if args.log_level:
+        os.environ["WEBSEARCH_LOG_LEVEL"] = args.log_level
+    if args.log_format:
+        os.environ["WEBSEARCH_LOG_FORMAT"] = args.log_format
+    if args.metrics:
+        os.environ["WEBSEARCH_METRICS"] = "1"
+    _configure_log_from_env()
+
+    if args.stats:
+        print_stats()
+        return
+
+    if args.daemon:
+        run_daemon(args)
+        return
+    if args.rebuild_index:
+        index = rebuild_trigram_index(args.history_file)
+        print(f"indexed {len(index.ids)} entries into {_index_path(args.history_file)}")
+        return
+    if args.check_index:
+        problems = check_trigram_index(args.history_file)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print("trigram index is consistent with history")
+        return
+
+    if IS_WAYLAND:
+        _mark_startup("launch_rofi", started)
+        launch_rofi(args)
+    else:
+        # dmenu path — script-mode doesn't apply
+        _mark_startup("launch_dmenu", started)
+        launch_dmenu(args)
+
+
+if __name__ == "__main__":
+    main()
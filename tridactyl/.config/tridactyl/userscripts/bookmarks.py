@@ -1,16 +1,31 @@
 #!/usr/bin/env python3
 """
 Bookmarks — Browse HTML bookmark files via rofi (Wayland) or dmenu (X11).
+
+Every file, directory (its *.html) or glob in DEFAULT_PATHS or --source is
+loaded; with more than one, each file becomes a top-level folder. A file is
+parsed only when its mtime or size changes, changed files in parallel; the
+tree is kept in the shared index (localindex.py) and read back one folder at
+a time as it is browsed. bookmarks_bench.py times cold and warm start-up.
+
+On Wayland the browser is a rofi script mode (like search.py): the whole walk
+through the folders happens in one rofi window, each pick re-running this
+script to list the next folder from the index, and rofi closes once a link
+is opened.
+
+--flat lists every link as "Folder / Sub / Title  url" in a single fuzzy
+menu instead, so any bookmark is one menu away.
 """
 
-import argparse
-import glob
 import os
-import subprocess
 import sys
 from html.parser import HTMLParser
 
+# argparse, glob, subprocess and the process pool are imported where they are
+# used, keeping each rofi script-mode call (one per folder opened) light.
+
 # ── Config ────────────────────────────────────────────────────────────────────
+# Bookmark files, directories of *.html exports or globs; all matches are merged
 DEFAULT_PATHS = [
     os.path.expanduser("~/.local/share/bookmarks/bookmarks.html"),
 ]
@@ -19,18 +34,47 @@ DEFAULT_PATHS = [
 IS_WAYLAND = bool(os.environ.get("WAYLAND_DISPLAY"))
 
 
-def menu(items, prompt="Bookmarks"):
-    """Show a menu via rofi (Wayland) or dmenu (X11). Returns selection or None."""
+def menu(items, prompt="Bookmarks", fuzzy=False):
+    """
+    Show a menu via rofi (Wayland) or dmenu (X11).
+    Returns the index of the selected item, or None.
+    """
+    import subprocess
+
     if IS_WAYLAND:
-        cmd = ["rofi", "-dmenu", "-i", "-p", prompt]
+        # rofi reports the row number itself, whatever the lines say
+        cmd = ["rofi", "-dmenu", "-i", "-format", "i", "-p", prompt]
+        if fuzzy:
+            cmd += ["-matching", "fuzzy", "-sort", "-sorting-method", "fzf"]
+        lines = items
     else:
         cmd = ["dmenu", "-p", prompt]
-    result = subprocess.run(cmd, input="\n".join(items), capture_output=True, text=True)
-    return result.stdout.strip() if result.returncode == 0 else None
+        lines = _unique_lines(items)
+    result = subprocess.run(cmd, input="\n".join(lines), capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    choice = result.stdout.rstrip("\n")
+    if IS_WAYLAND:
+        index = int(choice) if choice.isdigit() else -1
+    else:
+        index = {line: i for i, line in enumerate(lines)}.get(choice, -1)
+    return index if 0 <= index < len(items) else None
+
+
+def _unique_lines(items):
+    """dmenu only echoes the line back: number repeats so each maps to one row."""
+    seen = {}
+    lines = []
+    for item in items:
+        seen[item] = seen.get(item, 0) + 1
+        lines.append(item if seen[item] == 1 else f"{item} ({seen[item]})")
+    return lines
 
 
 def error(msg):
     """Show an error message via rofi -e (Wayland) or notify-send (X11)."""
+    import subprocess
+
     if IS_WAYLAND:
         subprocess.run(["rofi", "-e", msg], check=False)
     else:
@@ -38,57 +82,206 @@ def error(msg):
 
 
 # ── Parser ────────────────────────────────────────────────────────────────────
+PARSE_CHUNK = 1024 * 1024  # characters fed to the parser at a time
+
+
+class Folder:
+    """
+    A bookmark folder. children is None until the shared index fills it in
+    from the rows of source under pos (-1: the top level of the file).
+    """
+
+    __slots__ = ("title", "children", "pos", "source")
+    is_folder = True
+
+    def __init__(self, title, children=None, pos=-1, source=None):
+        self.title = title
+        self.children = children
+        self.pos = pos
+        self.source = source
+
+
+class Link:
+    __slots__ = ("title", "url")
+    is_folder = False
+
+    def __init__(self, title, url):
+        self.title = title
+        self.url = url
+
+
 class BookmarkParser(HTMLParser):
+    """
+    Builds a Folder/Link tree from a Netscape bookmark export fed in chunks.
+
+    An <H3> names the folder that the following <DL> opens. Titles are
+    interned: folder names and duplicate link titles then share one string.
+    """
+
     def __init__(self):
         super().__init__()
-        self.root = {"title": "ROOT", "children": [], "type": "folder"}
+        self.root = Folder("ROOT", [])
         self._stack = [self.root]
-        self._next_title = None
-        self._in_a = False
-        self._current_href = None
+        self._pending = None  # folder named by the last </h3>, awaiting its <dl>
+        self._title = None  # text parts of the <h3>/<a> being read
+        self._href = None
 
     def handle_starttag(self, tag, attrs):
-        attrs = dict(attrs)
         if tag == "dl":
-            if self._stack[-1].get("_pending_folder"):
-                folder = self._stack[-1]["_pending_folder"]
-                self._stack[-1]["children"].append(folder)
-                self._stack.append(folder)
-                del self._stack[-2]["_pending_folder"]
+            if self._pending is not None:
+                self._stack[-1].children.append(self._pending)
+                self._stack.append(self._pending)
+                self._pending = None
         elif tag == "h3":
-            self._next_title = ""
+            self._title = []
         elif tag == "a":
-            self._in_a = True
-            self._current_href = attrs.get("href", "")
-            self._next_title = ""
+            self._href = ""
+            for name, value in attrs:
+                if name == "href":
+                    self._href = value or ""
+                    break
+            self._title = []
 
     def handle_endtag(self, tag):
         if tag == "h3":
-            folder = {
-                "title": self._next_title or "Folder",
-                "children": [],
-                "type": "folder",
-            }
-            self._stack[-1]["_pending_folder"] = folder
-            self._next_title = None
+            if self._title is not None:
+                self._pending = Folder(sys.intern("".join(self._title) or "Folder"), [])
+            self._title = None
         elif tag == "a":
-            if self._in_a:
-                item = {
-                    "title": self._next_title or self._current_href,
-                    "url": self._current_href,
-                    "type": "link",
-                }
-                self._stack[-1]["children"].append(item)
-            self._in_a = False
-            self._current_href = None
-            self._next_title = None
+            if self._href is not None:
+                title = "".join(self._title or ()) or self._href
+                self._stack[-1].children.append(Link(sys.intern(title), self._href))
+            self._href = None
+            self._title = None
         elif tag == "dl":
+            self._pending = None
             if len(self._stack) > 1:
                 self._stack.pop()
 
     def handle_data(self, data):
-        if self._next_title is not None:
-            self._next_title += data
+        if self._title is not None:
+            self._title.append(data)
+
+
+def parse_bookmarks(path):
+    """Parse an HTML bookmark file into its ROOT Folder, streaming it in chunks."""
+    bp = BookmarkParser()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while chunk := f.read(PARSE_CHUNK):
+            bp.feed(chunk)
+    bp.close()
+    return bp.root
+
+
+# ── Shared index ──────────────────────────────────────────────────────────────
+def index_rows(path):
+    """Flatten a bookmark file into localindex rows, in document order."""
+    rows = []
+
+    def walk(folder, parent):
+        for child in folder.children:
+            if child.is_folder:
+                rows.append((parent, child.title, None, None))
+                walk(child, len(rows) - 1)
+            else:
+                rows.append((parent, child.title, child.url, None))
+
+    walk(parse_bookmarks(path), -1)
+    return rows
+
+
+class BookmarkTree:
+    """
+    Folders read from the shared index one at a time, as they are opened.
+
+    Built without an index (the database could not be used) it serves an
+    already parsed tree, whose folders all have their children filled in.
+    """
+
+    def __init__(self, index=None, labels=None):
+        self.index = index
+        self.labels = labels or {}  # source path -> its top-level folder title
+
+    def children(self, folder):
+        if folder.children is None:
+            source = folder.source
+            folder.children = [
+                Folder(title, None, pos, source) if url is None else Link(title, url)
+                for pos, title, url in self.index.children(source, folder.pos)
+            ]
+        return folder.children
+
+    def links(self, root):
+        """(title, url, folder path) of every link, read from the index if any."""
+        if self.index is not None:
+            if len(self.labels) == 1:
+                return self.index.links(next(iter(self.labels)))
+            return [
+                (title, url, f"{label} / {folder}" if folder else label)
+                for path, label in self.labels.items()
+                for title, url, folder in self.index.links(path)
+            ]
+        links = []
+
+        def walk(folder, crumb):
+            for child in folder.children:
+                if child.is_folder:
+                    title = " ".join(child.title.split())
+                    walk(child, f"{crumb} / {title}" if crumb else title)
+                else:
+                    links.append((child.title, child.url, crumb))
+
+        walk(root, "")
+        return links
+
+
+def source_labels(paths):
+    """Top-level folder title per source: its file name, or dir/name on a clash."""
+    names = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    return {
+        path: name
+        if names.count(name) == 1
+        else f"{os.path.basename(os.path.dirname(path))}/{name}"
+        for path, name in zip(paths, names)
+    }
+
+
+def refresh_sources(index, paths):
+    """Reindex the sources that changed, parsing several in parallel."""
+    import concurrent.futures
+
+    stale = index.stale(paths)
+    todo = [path for path, sig in stale.items() if sig is not None]
+    workers = min(len(todo), os.cpu_count() or 1)
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            rows = dict(zip(todo, pool.map(index_rows, todo)))
+    else:
+        rows = {path: index_rows(path) for path in todo}
+    for path, sig in stale.items():
+        index.store("bookmark", path, sig, rows.get(path, []))
+
+
+def open_tree(paths):
+    """(tree, root folder) over every source in paths, reparsing only changes."""
+    import sqlite3
+
+    from localindex import LocalIndex
+
+    labels = source_labels(paths)
+    try:
+        index = LocalIndex()
+        refresh_sources(index, paths)
+    except sqlite3.Error:
+        roots = [parse_bookmarks(path) for path in paths]
+        if len(roots) == 1:
+            return BookmarkTree(), roots[0]
+        tops = [Folder(labels[p], r.children) for p, r in zip(paths, roots)]
+        return BookmarkTree(), Folder("ROOT", tops)
+    tree = BookmarkTree(index, labels)
+    if len(paths) == 1:
+        return tree, Folder("ROOT", source=paths[0])
+    return tree, Folder("ROOT", [Folder(labels[p], source=p) for p in paths])
 
 
 # ── Navigation ────────────────────────────────────────────────────────────────
@@ -96,86 +289,214 @@ BACK = "<- Back"
 
 
 def open_url(url, browser):
+    import subprocess
+
     subprocess.Popen(
         [browser, url], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
     )
 
 
-def browse(folder, browser, breadcrumb=None):
+def browse(tree, folder, browser, breadcrumb=None):
     breadcrumb = breadcrumb or []
     path_str = " / ".join(["ROOT"] + breadcrumb) if breadcrumb else "ROOT"
 
     while True:
-        children = folder.get("children", [])
+        children = tree.children(folder)
         entries = []
         if breadcrumb:
             entries.append(BACK)
         for child in children:
-            if child["type"] == "folder":
-                entries.append(f" {child['title']}")
+            # One line per row: a newline in a title would shift every index
+            title = " ".join(child.title.split())
+            if child.is_folder:
+                entries.append(f" {title}")
             else:
-                entries.append(f" {child['title']}")
+                entries.append(f" {title}")
 
-        choice = menu(entries, prompt=path_str)
-        if choice is None:
-            return
-        if choice == BACK:
-            return
-
-        # Strip prefix
-        label = choice.lstrip("").strip()
-
-        matched = None
-        for child in children:
-            if child["title"] == label:
-                matched = child
-                break
-
-        if matched is None:
+        picked = menu(entries, prompt=path_str)
+        if picked is None:
             return
+        if breadcrumb:
+            if picked == 0:  # BACK
+                return
+            picked -= 1
 
-        if matched["type"] == "folder":
-            browse(matched, browser, breadcrumb + [matched["title"]])
+        matched = children[picked]
+        if matched.is_folder:
+            browse(tree, matched, browser, breadcrumb + [matched.title])
         else:
-            open_url(matched["url"], browser)
+            open_url(matched.url, browser)
+
+
+# ── Flat mode ─────────────────────────────────────────────────────────────────
+def flat_entries(links, prefix=""):
+    """
+    (menu lines, urls): one "Folder / Sub / Title  url" line per link.
+    prefix is the folder path of the collapsed root, left off every line.
+    """
+    lines, urls = [], []
+    for title, url, folder in links:
+        if prefix and (folder == prefix or folder.startswith(prefix + " / ")):
+            folder = folder[len(prefix) + 3 :]
+        title = " ".join(title.split()) or url
+        line = f" {folder} / {title}  {url}" if folder else f" {title}  {url}"
+        lines.append(line)
+        urls.append(url)
+    return lines, urls
+
+
+def browse_flat(tree, root, browser, prefix=""):
+    lines, urls = flat_entries(tree.links(root), prefix)
+    picked = menu(lines, prompt="Bookmarks", fuzzy=True)
+    if picked is not None:
+        open_url(urls[picked], browser)
+
+
+# ── Rofi script mode ──────────────────────────────────────────────────────────
+# On Wayland the folder browser runs as a rofi script mode: rofi stays open and
+# calls this script once per selection, so opening a folder only swaps the rows.
+# Every row carries its child index as \0info; the path of child indices from
+# the collapsed root to the open folder rides along in rofi's \0data, and the
+# folder is looked up again from the shared index on each call.
+ROFI_PROMPT = "\0prompt\x1f"
+ROFI_DATA = "\0data\x1f"  # handed back to the next call as $ROFI_DATA
+ROFI_NO_CUSTOM = "\0no-custom\x1ftrue\n"
+ROFI_BACK = "back"  # \0info of the BACK row
+
+
+def launch_rofi(paths, browser):
+    import subprocess
+
+    env = os.environ.copy()
+    env.update(
+        {
+            "BOOKMARKS_ACTIVE": "1",
+            "BOOKMARKS_BROWSER": browser,
+            "BOOKMARKS_SOURCES": os.pathsep.join(paths),
+        }
+    )
+    script = os.path.abspath(sys.argv[0])
+    cmd = ["rofi", "-show", "bookmarks", "-modi", f"bookmarks:{script}", "-i"]
+    subprocess.run(cmd, env=env, check=False)
+
+
+def script_mode():
+    """Render one folder for rofi, or open the picked link and let rofi close."""
+    paths = os.environ["BOOKMARKS_SOURCES"].split(os.pathsep)
+    tree, base = open_tree(paths)
+    base, _ = collapse_root(tree, base)
+    try:
+        trail = [int(i) for i in os.environ.get("ROFI_DATA", "").split("/") if i]
+        folder, crumbs = _walk(tree, base, trail)
+    except (ValueError, IndexError):  # the file changed under the open menu
+        trail, folder, crumbs = [], base, []
+
+    info = os.environ.get("ROFI_INFO", "")
+    if os.environ.get("ROFI_RETV") == "1" and info:
+        children = tree.children(folder)
+        if info == ROFI_BACK:
+            trail = trail[:-1]
+        elif info.isdigit() and int(info) < len(children):
+            child = children[int(info)]
+            if not child.is_folder:
+                open_url(child.url, os.environ.get("BOOKMARKS_BROWSER", "xdg-open"))
+                return
+            trail.append(int(info))
+        folder, crumbs = _walk(tree, base, trail)
+    _render_folder(tree, folder, trail, crumbs)
+
+
+def _walk(tree, base, trail):
+    """(folder, titles) at the end of a trail of child indices from base."""
+    folder, crumbs = base, []
+    for i in trail:
+        folder = tree.children(folder)[i]
+        if not folder.is_folder:
+            raise IndexError(i)
+        crumbs.append(" ".join(folder.title.split()))
+    return folder, crumbs
+
+
+def _render_folder(tree, folder, trail, crumbs):
+    out = [
+        f"{ROFI_PROMPT}{' / '.join(['ROOT'] + crumbs)}\n",
+        f"{ROFI_DATA}{'/'.join(map(str, trail))}\n",
+        ROFI_NO_CUSTOM,
+    ]
+    if trail:
+        out.append(f"{BACK}\0info\x1f{ROFI_BACK}\n")
+    for i, child in enumerate(tree.children(folder)):
+        icon = "" if child.is_folder else ""
+        out.append(f"{icon} {' '.join(child.title.split())}\0info\x1f{i}\n")
+    sys.stdout.write("".join(out))
 
 
 # ── Entry point ───────────────────────────────────────────────────────────────
-def find_bookmark_file():
-    for pattern in DEFAULT_PATHS:
-        matches = glob.glob(pattern)
-        if matches:
-            return matches[0]
-    return None
+def find_bookmark_files(patterns):
+    """Every file matched by patterns: files, globs and directories' *.html."""
+    import glob
+
+    found = []
+    for pattern in patterns:
+        for match in sorted(glob.glob(os.path.expanduser(pattern))):
+            if os.path.isdir(match):
+                found += sorted(glob.glob(os.path.join(match, "*.htm*")))
+            elif os.path.isfile(match):
+                found.append(match)
+    unique = {}
+    for path in found:
+        unique.setdefault(os.path.realpath(path), path)
+    return list(unique.values())
+
+
+def collapse_root(tree, root):
+    """(folder, titles): skip down single-folder chains such as an export's
+    one top-level "Bookmarks" folder, listing the titles skipped."""
+    collapsed = []
+    while len(tree.children(root)) == 1 and root.children[0].is_folder:
+        root = root.children[0]
+        collapsed.append(" ".join(root.title.split()))
+    return root, collapsed
 
 
 def main():
+    if IS_WAYLAND and "BOOKMARKS_ACTIVE" in os.environ:
+        script_mode()
+        return
+
+    import argparse
+
     parser = argparse.ArgumentParser(description="Browse HTML bookmarks.")
     parser.add_argument("--browser", default="xdg-open")
+    parser.add_argument(
+        "--flat",
+        action="store_true",
+        help="pick from every link, with its folder path, in one fuzzy menu",
+    )
+    parser.add_argument(
+        "--source",
+        action="append",
+        dest="sources",
+        metavar="PATH",
+        help="bookmark file, directory or glob; repeatable (default: DEFAULT_PATHS)",
+    )
     args = parser.parse_args()
 
-    path = find_bookmark_file()
-    if not path:
-        error("No bookmark file found. Check DEFAULT_PATHS in the script.")
-        sys.exit(1)
-
-    if not os.path.isfile(path):
-        error(f"File not found: {path}")
+    paths = find_bookmark_files(args.sources or DEFAULT_PATHS)
+    if not paths:
+        error("No bookmark file found. Check DEFAULT_PATHS or --source.")
         sys.exit(1)
 
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        html = f.read()
-
-    bp = BookmarkParser()
-    bp.feed(html)
-
-    root = bp.root
-    while (
-        len(root.get("children", [])) == 1 and root["children"][0]["type"] == "folder"
-    ):
-        root = root["children"][0]
+    if IS_WAYLAND and not args.flat:
+        launch_rofi(paths, args.browser)
+        return
 
-    browse(root, args.browser)
+    tree, root = open_tree(paths)
+    root, collapsed = collapse_root(tree, root)
+    if args.flat:
+        browse_flat(tree, root, args.browser, " / ".join(collapsed))
+    else:
+        browse(tree, root, args.browser)
 
 
 if __name__ == "__main__":
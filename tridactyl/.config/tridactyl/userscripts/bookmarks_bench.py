@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+bookmarks_bench.py — Start-up benchmark for bookmarks.py.
+
+Writes a synthetic bookmark export of each --sizes megabytes into a throwaway
+HOME and times, each sample in a fresh interpreter, the work bookmarks.py does
+before its first menu:
+  parse  read and parse the whole file (what every launch cost before the
+         shared index)
+  cold   open the tree with no index yet: parse plus the index build
+  warm   open the tree from the up-to-date index and list the top folder
+
+Wall time (interpreter start-up included) and the time spent inside the
+script are reported as p50/p99 JSON, e.g. to compare two revisions:
+  bookmarks_bench.py -o before.json
+  git checkout <other> && bookmarks_bench.py -o after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+
+BENCH_SIZES = [1, 10]  # MB of bookmark HTML
+BENCH_RUNS = {"parse": 3, "cold": 3, "warm": 10}
+_WORDS = (
+    "linux rust python kernel arch wiki docs async search rofi git tips "
+    "release notes guide howto manual forum blog video news"
+).split()
+
+# Each sample prints the seconds it spent after interpreter start-up
+_SAMPLE = {
+    "parse": (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        "import bookmarks\n"
+        "bookmarks.parse_bookmarks(sys.argv[1])\n"
+        "print(time.perf_counter() - t)\n"
+    ),
+    "cold": (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        "import bookmarks\n"
+        "tree, root = bookmarks.open_tree([sys.argv[1]])\n"
+        "tree.children(root)\n"
+        "print(time.perf_counter() - t)\n"
+    ),
+}
+_SAMPLE["warm"] = _SAMPLE["cold"]
+
+
+def _generate(path: str, size_mb: int) -> int:
+    """Write a nested Netscape bookmark file of about size_mb; return its links."""
+    rng = random.Random(size_mb)
+    target = size_mb * 1024 * 1024
+    links = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE NETSCAPE-Bookmark-file-1>\n<DL><p>\n")
+        folder = 0
+        while f.tell() < target:
+            f.write(f'<DT><H3 ADD_DATE="1700000000">Folder {folder}</H3>\n<DL><p>\n')
+            for sub in range(rng.randint(0, 3)):
+                f.write(f"<DT><H3>Folder {folder}.{sub}</H3>\n<DL><p>\n")
+                links += _write_links(f, rng, rng.randint(5, 40))
+                f.write("</DL><p>\n")
+            links += _write_links(f, rng, rng.randint(5, 40))
+            f.write("</DL><p>\n")
+            folder += 1
+        f.write("</DL><p>\n")
+    return links
+
+
+def _write_links(f, rng: random.Random, count: int) -> int:
+    for _ in range(count):
+        title = " ".join(rng.sample(_WORDS, 4))
+        host = f"{rng.choice(_WORDS)}{rng.randint(0, 99999)}.example.org"
+        f.write(
+            f'<DT><A HREF="https://{host}/{rng.choice(_WORDS)}" '
+            f'ADD_DATE="1700000000">{title}</A>\n'
+        )
+    return count
+
+
+def _percentile(samples: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def _sample(case: str, path: str, env: dict[str, str]) -> tuple[float, float]:
+    """(wall ms, in-script ms) of one fresh-interpreter run of case."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _SAMPLE[case], path],
+        env=env,
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = (time.perf_counter() - start) * 1000
+    return wall, float(proc.stdout) * 1000
+
+
+def _revision() -> "str | None":
+    proc = subprocess.run(
+        ["git", "-C", HERE, "describe", "--always", "--dirty"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return proc.stdout.strip() or None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark bookmarks.py start-up.")
+    parser.add_argument(
+        "--sizes",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=BENCH_SIZES,
+        help="comma-separated bookmark file sizes in MB",
+    )
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bookmarks-bench-") as root:
+        env = {
+            "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+            "HOME": root,
+            "PYTHONPATH": HERE,
+        }
+        index_db = os.path.join(root, ".cache", "userscripts", "index.db")
+        for size_mb in args.sizes:
+            path = os.path.join(root, f"bookmarks-{size_mb}.html")
+            links = _generate(path, size_mb)
+            for case, runs in BENCH_RUNS.items():
+                walls, inner = [], []
+                for _ in range(runs):
+                    if case == "cold":
+                        for suffix in ("", "-wal", "-shm"):
+                            if os.path.exists(index_db + suffix):
+                                os.unlink(index_db + suffix)
+                    wall, ms = _sample(case, path, env)
+                    walls.append(wall)
+                    inner.append(ms)
+                walls.sort()
+                inner.sort()
+                result = {
+                    "case": case,
+                    "size_mb": size_mb,
+                    "links": links,
+                    "runs": runs,
+                    "wall_p50_ms": round(_percentile(walls, 50), 1),
+                    "wall_p99_ms": round(_percentile(walls, 99), 1),
+                    "script_p50_ms": round(_percentile(inner, 50), 1),
+                }
+                results.append(result)
+                print(
+                    f"{case:<6} {size_mb:>4} MB  wall p50 "
+                    f"{result['wall_p50_ms']:8.1f} ms  script p50 "
+                    f"{result['script_p50_ms']:8.1f} ms",
+                    file=sys.stderr,
+                )
+    text = json.dumps(
+        {
+            "revision": _revision(),
+            "python": platform.python_version(),
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()